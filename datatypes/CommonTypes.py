@@ -17,4 +17,9 @@ class OWMFile:
 
     def __repr__(self):
         return '<{}>: GUID:{}, Path: {}'.format(__class__.__name__, self.GUID, self.filepath)
-        
\ No newline at end of file
+
+
+class OWMFileInfo(OWMFile):
+    def __init__(self, header, filepath):
+        super().__init__(filepath)
+        self.header = header
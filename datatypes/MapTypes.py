@@ -35,11 +35,11 @@ class OWMAPEntity:
         self.records = []
 
 
-class OWMAPRecord:
-    def __init__(self, position, scale, rotation):
-        self.position = position
-        self.scale = scale
-        self.rotation = rotation
+# instance transforms are rows of (N, 10) float32 arrays instead of one object each
+RECORD_WIDTH = 10
+RECORD_POSITION = slice(0, 3)
+RECORD_SCALE = slice(3, 6)
+RECORD_ROTATION = slice(6, 10) # xyzw
 
 
 class OWMAPDetail:
@@ -1,5 +1,6 @@
 from .CommonTypes import OWMFile
-from mathutils import Vector
+import copy
+import numpy
 
 class ModelData:
     def __init__(self, armature, meshes, empties, meshData):
@@ -20,6 +21,18 @@ class OWMDLFile(OWMFile):
         self.meshes = []
         self.empties = []
 
+    def detach(self, streams):
+        # decodes the given mesh streams and drops the file buffer so the model can be pickled
+        for mesh in self.meshes:
+            mesh.detach(streams)
+
+    def detached(self, streams):
+        # same but on a copy, for models that came out of the reader cache
+        data = copy.copy(self)
+        data.meshes = [copy.copy(mesh) for mesh in self.meshes]
+        data.detach(streams)
+        return data
+
 
 class OWMDLHeader:
     def __init__(self, major, minor, material, name, guid, boneCount, meshCount, emptyCount):
@@ -41,6 +54,22 @@ class OWMDLBone:
         self.rot = rot
 
 
+class LazyStream:
+    # decoded on first access, the result then sits in the instance dict and shadows this
+    def __init__(self, decode):
+        self.decode = decode
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, mesh, owner=None):
+        if mesh is None:
+            return self
+        value = self.decode(mesh, self.name)
+        mesh.__dict__[self.name] = value
+        return value
+
+
 class OWMDLMesh:
     def __init__(self, name, materialKey, uvCount, vertexCount, indexCount, boneDataCount):
         self.name = name
@@ -49,34 +78,78 @@ class OWMDLMesh:
         self.vertexCount = vertexCount
         self.indexCount = indexCount
         self.boneDataCount = boneDataCount
-        # raw
-        self.vertices = []
-        self.rawUVs = []
-        self.rawNormals = []
-        self.rawColor1 = []
-        self.rawColor2 = []
-        self.tangents = [] # unused ¯\_(ツ)_/¯
-        # processed for blender
-        self.normals = []
-        self.color1 = []
-        self.color2 = []
-        self.uvs = [list() for l in range(uvCount)]
-        self.boneIndices = []
-        self.boneWeights = []
-        self.indices = []
+        # where each stream lives in source: name -> (offset, fmt, count)
+        self.source = None
+        self.arrays = False
+        self.streamOffsets = {}
+
+    def addStream(self, name, offset, fmt, count):
+        self.streamOffsets[name] = (offset, fmt, count)
+
+    def decodeStream(self, name):
+        if name not in self.streamOffsets:
+            return []
+        offset, fmt, count = self.streamOffsets[name]
+        if self.arrays:
+            return self.source.readArray(fmt, count, offset)
+        return self.source.readFmtArray(fmt, count, offset)
+
+    def decodeUVs(self, name):
+        return [self.decodeStream("rawUV{}".format(i)) for i in range(self.uvCount)]
+
+    # raw
+    vertices = LazyStream(decodeStream)
+    rawUVs = LazyStream(decodeUVs)
+    rawNormals = LazyStream(decodeStream)
+    rawColor1 = LazyStream(decodeStream)
+    rawColor2 = LazyStream(decodeStream)
+    tangents = LazyStream(decodeStream) # unused ¯\_(ツ)_/¯
+    boneIndices = LazyStream(decodeStream)
+    boneWeights = LazyStream(decodeStream)
+    indices = LazyStream(decodeStream)
+
+    # processed for blender, whole stream at once, works on both the tuple and the array output of the reader
+    # a raw stream that isn't there (or wasn't kept by detach) gives an empty array instead of failing the reshape
+    def processNormals(self, name):
+        if len(self.rawNormals) == 0:
+            return numpy.zeros((0, 3), dtype=numpy.float32)
+        normals = numpy.asarray(self.rawNormals, dtype=numpy.float32).reshape(self.vertexCount, 3)
+        lengths = numpy.linalg.norm(normals, axis=1, keepdims=True)
+        return numpy.divide(normals, lengths, out=numpy.zeros_like(normals), where=lengths > 0)
+
+    def processColor(self, name):
+        raw = self.rawColor1 if name == "color1" else self.rawColor2
+        if len(raw) == 0:
+            return numpy.zeros(0, dtype=numpy.float32)
+        return numpy.asarray(raw, dtype=numpy.float32).reshape(self.vertexCount, 4)[:, (3, 0, 1, 2)].ravel()
+
+    def processUVs(self, name):
+        # one gather for every uv layer, indexed by the face corners
+        if any(len(uv) == 0 for uv in self.rawUVs):
+            return numpy.zeros((0, 0, 2), dtype=numpy.float32)
+        corners = numpy.asarray(self.indices, dtype=numpy.intp).ravel()
+        uvs = numpy.asarray(self.rawUVs, dtype=numpy.float32).reshape(self.uvCount, self.vertexCount, 2)
+        # take keeps the result c contiguous so each layer goes to foreach_set without a copy, uvs[:, corners] doesn't
+        return uvs.take(corners, axis=1)
+
+    normals = LazyStream(processNormals)
+    color1 = LazyStream(processColor)
+    color2 = LazyStream(processColor)
+    uvs = LazyStream(processUVs)
+
+    def detach(self, streams):
+        for name in streams:
+            getattr(self, name)
+        # intermediate streams that were only needed to build the requested ones
+        for name in list(self.__dict__):
+            if name not in streams and isinstance(getattr(type(self), name, None), LazyStream):
+                del self.__dict__[name]
+        self.source = None
+        self.streamOffsets = {}
 
     def blendProcess(self):
-        for i in range(self.vertexCount):
-            self.normals.append(Vector(self.rawNormals[i]).normalized())
-            col1=self.rawColor1[i]
-            self.color1+=[col1[3],col1[0],col1[1],col1[2]]
-            col2=self.rawColor2[i]
-            self.color2+=[col2[3],col2[0],col2[1],col2[2]]
-
-        for face in self.indices:
-            for vert in face:
-                for k in range(self.uvCount):
-                    self.uvs[k].append(self.rawUVs[k][vert])
+        # forces everything blender needs, normally these get processed on first access
+        return self.normals, self.color1, self.color2, self.uvs
 
 class OWMDLEmpty:
     def __init__(self, name, hardpoint, position, rotation):
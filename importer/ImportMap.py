@@ -1,4 +1,7 @@
+import numpy
+
 from .blender import BLMap as blenderMap
+from ..datatypes import MapTypes
 from ..readers import OWMapReader
 from ..ui import UIUtil
 
@@ -20,7 +23,7 @@ class MapTree:
                 self.modelLookPaths.setdefault(entity.material.GUID, entity.material.filepath)
 
                 self.objects[obj.model.GUID].setdefault(entity.material.GUID, [])
-                self.objects[obj.model.GUID][entity.material.GUID] += entity.records
+                self.objects[obj.model.GUID][entity.material.GUID].append(entity.records)
 
     def buildTreeFromDetails(self, mapData):
         for prop in mapData.details:
@@ -32,6 +35,12 @@ class MapTree:
             self.objects[prop.model.GUID].setdefault(prop.material.GUID, [])
             self.objects[prop.model.GUID][prop.material.GUID].append(prop.record)
 
+    def packRecords(self):
+        # one (N, 10) array per model/look, copied out of the file buffer
+        for looks in self.objects.values():
+            for lookID, records in looks.items():
+                looks[lookID] = numpy.vstack(records) if records else numpy.empty((0, MapTypes.RECORD_WIDTH), dtype=numpy.float32)
+
     def loadLights(self, data):
         if data.lights:
             self.lights = set(data.lights)
@@ -57,6 +66,8 @@ def init(filename, mapSettings, modelSettings, lightSettings, entitySettings):
 
     if mapSettings.importDetails:
         mapTree.buildTreeFromDetails(data)
+
+    mapTree.packRecords()
     
     if mapSettings.importLights:
         mapTree.loadLights(data)
@@ -3,20 +3,22 @@ from ...datatypes.EntityTypes import EntityData
 from ...readers import OWEntityReader
 
 
-def readEntity(filename, modelSettings, entitySettings, childData=None):
-    data = OWEntityReader.read(filename)
+def readEntity(filename, modelSettings, entitySettings, childData=None, prefetched=None):
+    data = prefetched.get(filename) if prefetched else None
+    if not data:
+        data = OWEntityReader.read(filename)
     if not data: return None
 
     children = []
 
     baseModel = None
     if data.model:
-        baseModel = BLModel.readMDL(data.model.filepath, modelSettings)
+        baseModel = BLModel.readMDL(data.model.filepath, modelSettings, prefetched)
 
     if entitySettings.importChildren:
         for child in data.children:
 
-            children.append(readEntity(child.filepath, modelSettings, entitySettings, child))
+            children.append(readEntity(child.filepath, modelSettings, entitySettings, child, prefetched))
 
             # TODO effects?
 
@@ -0,0 +1,96 @@
+import bpy
+import numpy
+
+from . import BLUtils
+
+# alternatives to copying the whole model hierarchy for every map record
+
+POINTS_NODE_GROUP = "OWM Instance On Points"
+
+def addSocket(nodeGroup, inOut, socketType, name):
+    # 4.0 moved group sockets to the interface api
+    if hasattr(nodeGroup, "interface"):
+        return nodeGroup.interface.new_socket(name=name, in_out=inOut, socket_type=socketType)
+    sockets = nodeGroup.inputs if inOut == 'INPUT' else nodeGroup.outputs
+    return sockets.new(socketType, name)
+
+def groupSockets(nodeGroup):
+    # (in_out, socket type, name) -> identifier, from whichever api addSocket used
+    if hasattr(nodeGroup, "interface"):
+        return {(item.in_out, item.socket_type, item.name): item.identifier for item in nodeGroup.interface.items_tree if item.item_type == 'SOCKET'}
+    sockets = {('INPUT', socket.bl_socket_idname, socket.name): socket.identifier for socket in nodeGroup.inputs}
+    sockets.update((('OUTPUT', socket.bl_socket_idname, socket.name), socket.identifier) for socket in nodeGroup.outputs)
+    return sockets
+
+POINTS_SOCKETS = (('INPUT', 'NodeSocketGeometry', "Geometry"), ('INPUT', 'NodeSocketCollection', "Collection"), ('OUTPUT', 'NodeSocketGeometry', "Geometry"))
+
+def findPointsNodeGroup():
+    # the group from an earlier import, as long as nobody changed its sockets
+    nodeGroup = bpy.data.node_groups.get(POINTS_NODE_GROUP)
+    if nodeGroup is None or nodeGroup.bl_idname != 'GeometryNodeTree' or not nodeGroup.nodes:
+        return None
+    sockets = groupSockets(nodeGroup)
+    if set(sockets) != set(POINTS_SOCKETS):
+        return None
+    return nodeGroup, sockets[POINTS_SOCKETS[1]]
+
+def namedAttribute(nodes, name):
+    node = nodes.new("GeometryNodeInputNamedAttribute")
+    node.data_type = 'FLOAT_VECTOR'
+    node.inputs["Name"].default_value = name
+    # before 4.1 there is one output per data type, only the active one is enabled
+    return next(socket for socket in node.outputs if socket.enabled)
+
+def createPointsNodeGroup():
+    # points in, the collection input instanced on every point using the rotation and scale attributes
+    found = findPointsNodeGroup()
+    if found is not None:
+        return found
+    nodeGroup = bpy.data.node_groups.new(POINTS_NODE_GROUP, 'GeometryNodeTree')
+    addSocket(nodeGroup, 'INPUT', 'NodeSocketGeometry', "Geometry")
+    collectionSocket = addSocket(nodeGroup, 'INPUT', 'NodeSocketCollection', "Collection")
+    addSocket(nodeGroup, 'OUTPUT', 'NodeSocketGeometry', "Geometry")
+
+    nodes = nodeGroup.nodes
+    links = nodeGroup.links
+    groupInput = nodes.new("NodeGroupInput")
+    groupOutput = nodes.new("NodeGroupOutput")
+    collectionInfo = nodes.new("GeometryNodeCollectionInfo")
+    collectionInfo.transform_space = 'ORIGINAL'
+    instanceOnPoints = nodes.new("GeometryNodeInstanceOnPoints")
+
+    links.new(groupInput.outputs["Collection"], collectionInfo.inputs["Collection"])
+    links.new(groupInput.outputs["Geometry"], instanceOnPoints.inputs["Points"])
+    links.new(collectionInfo.outputs[0], instanceOnPoints.inputs["Instance"])
+    links.new(namedAttribute(nodes, "rotation"), instanceOnPoints.inputs["Rotation"])
+    links.new(namedAttribute(nodes, "scale"), instanceOnPoints.inputs["Scale"])
+    links.new(instanceOnPoints.outputs["Instances"], groupOutput.inputs["Geometry"])
+
+    groupInput.location = (-600, 0)
+    collectionInfo.location = (-300, -150)
+    instanceOnPoints.location = (0, 0)
+    groupOutput.location = (300, 0)
+    return nodeGroup, collectionSocket.identifier
+
+def createInstancePoints(name, transforms, collection, nodeGroup, collectionInput):
+    # one vertex per record, rotation and scale go in as point attributes
+    locations, rotations, scales = transforms
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(locations))
+    mesh.vertices.foreach_set("co", numpy.ascontiguousarray(locations, dtype=numpy.float32).ravel())
+    for attributeName, values in (("rotation", rotations), ("scale", scales)):
+        attribute = mesh.attributes.new(attributeName, 'FLOAT_VECTOR', 'POINT')
+        attribute.data.foreach_set("vector", numpy.ascontiguousarray(values, dtype=numpy.float32).ravel())
+    mesh.update()
+
+    obj = bpy.data.objects.new(name, mesh)
+    modifier = obj.modifiers.new("OWM Instances", 'NODES')
+    modifier.node_group = nodeGroup
+    modifier[collectionInput] = collection
+    return obj
+
+def excludeCollection(collection):
+    # keeps prototypes out of the viewport and renders, instancing still sees them
+    layerCollection = BLUtils.findLayerCollection(bpy.context.view_layer.layer_collection, collection)
+    if layerCollection is not None:
+        layerCollection.exclude = True
@@ -1,25 +1,102 @@
 import enum
 import bpy
 import bmesh
-from mathutils import Quaternion
 import math
+import time
+import numpy
 
 from ...ui import UIUtil
 
 from . import BLUtils
 from . import BLEntity
+from . import BLInstancing
 from . import BLModel
 from .BLMaterial import BlenderMaterialTree
-from ...readers import PathUtil
+from ...readers import PathUtil, Prefetch
 from ...TextureMap import TextureTypes
 
 
+def logRate(message, count, start):
+    elapsed = time.perf_counter() - start
+    UIUtil.log("{} in {:.2f}s ({:.0f}/s)".format(message, elapsed, count / elapsed if elapsed > 0 else 0))
+
+def recordTransforms(records):
+    # converted for the whole look at once, the loops below only assign
+    return list(zip(*(values.tolist() for values in BLUtils.recordTransforms(records))))
+
+
 class QueueItem:
     def __init__(self, parent, rec):
         self.parent = parent
         self.rec = rec
 
 
+def pairTriangles(mesh, threshold=0.9):
+    """Pick pairs of neighbouring triangles that face the same way.
+
+    Every triangle ends up in at most one pair, preferring the neighbour with the closest normal.
+
+    Args:
+        mesh: The Blender mesh data
+        threshold: Minimum dot product between the two normals
+
+    Returns:
+        Array of the edge indices shared by each pair
+    """
+    polyCount = len(mesh.polygons)
+    loopStarts = numpy.empty(polyCount, dtype=numpy.int32)
+    loopTotals = numpy.empty(polyCount, dtype=numpy.int32)
+    normals = numpy.empty(polyCount * 3, dtype=numpy.float32)
+    loopEdges = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+    mesh.polygons.foreach_get("loop_start", loopStarts)
+    mesh.polygons.foreach_get("loop_total", loopTotals)
+    mesh.polygons.foreach_get("normal", normals)
+    mesh.loops.foreach_get("edge_index", loopEdges)
+    normals = normals.reshape(polyCount, 3)
+
+    # edge of every face corner, in polygon order
+    faces = numpy.repeat(numpy.arange(polyCount), loopTotals)
+    corners = numpy.arange(len(faces)) - numpy.repeat(numpy.cumsum(loopTotals) - loopTotals, loopTotals)
+    edges = loopEdges[numpy.repeat(loopStarts, loopTotals) + corners]
+
+    # candidates: edges between exactly two faces that are both triangles
+    faceCount = numpy.bincount(edges, minlength=len(mesh.edges))
+    keep = (loopTotals[faces] == 3) & (faceCount[edges] == 2)
+    edges, faces = edges[keep], faces[keep]
+    order = numpy.argsort(edges, kind="stable")
+    edges, faces = edges[order], faces[order]
+    shared = numpy.flatnonzero((edges[1:] == edges[:-1]) & (faces[1:] != faces[:-1]))
+    a, b, edges = faces[shared], faces[shared + 1], edges[shared]
+    dots = numpy.einsum("ij,ij->i", normals[a], normals[b])
+    keep = dots > threshold
+    a, b, edges, dots = a[keep], b[keep], edges[keep], dots[keep]
+
+    # take every pair where both triangles like each other best, drop whatever touched those, repeat
+    paired = numpy.zeros(polyCount, dtype=bool)
+    chosen = []
+    while len(a):
+        candidates = numpy.arange(len(a))
+        owners = numpy.concatenate((a, b))
+        options = numpy.concatenate((candidates, candidates))
+        order = numpy.lexsort((-numpy.concatenate((dots, dots)), owners))
+        owners, options = owners[order], options[order]
+        first = numpy.ones(len(owners), dtype=bool)
+        first[1:] = owners[1:] != owners[:-1]
+        best = numpy.full(polyCount, -1)
+        best[owners[first]] = options[first]
+
+        mutual = (best[a] == candidates) & (best[b] == candidates)
+        if not mutual.any():
+            break
+        chosen.append(edges[mutual])
+        paired[a[mutual]] = True
+        paired[b[mutual]] = True
+        rest = ~(paired[a] | paired[b])
+        a, b, edges, dots = a[rest], b[rest], edges[rest], dots[rest]
+
+    return numpy.concatenate(chosen) if chosen else numpy.empty(0, dtype=numpy.int32)
+
+
 def process_mesh_topology(mesh, mapSettings):
     """Process mesh topology using bmesh operations.
     
@@ -32,46 +109,17 @@ def process_mesh_topology(mesh, mapSettings):
     bm.from_mesh(mesh.data)
     
     if mapSettings.fixTopology:
-        # First pass: collect triangle pairs
-        faces_to_join = []
-        processed = set()
-        
-        for face in bm.faces[:]:  # Create a copy of the faces list
-            if face.index in processed:
-                continue
-            
-            if len(face.verts) == 3:  # Only consider triangles
-                # Find best matching neighbor
-                best_neighbor = None
-                best_dot = -1.0
-                
-                for edge in face.edges:
-                    for other_face in edge.link_faces:
-                        if other_face != face and len(other_face.verts) == 3:
-                            if other_face.index not in processed:
-                                dot = face.normal.dot(other_face.normal)
-                                if dot > best_dot:
-                                    best_dot = dot
-                                    best_neighbor = other_face
-                
-                # If we found a good match
-                if best_neighbor and best_dot > 0.9:  # ~25 degree threshold
-                    faces_to_join.append((face, best_neighbor))
-                    processed.add(face.index)
-                    processed.add(best_neighbor.index)
-        
-        # Second pass: join collected pairs
-        for f1, f2 in faces_to_join:
-            if f1.is_valid and f2.is_valid:
-                try:
-                    bmesh.ops.join_triangles(
-                        bm,
-                        faces=[f1, f2],
-                        angle_face_threshold=3.14159,
-                        angle_shape_threshold=3.14159
-                    )
-                except:
-                    continue
+        # pairs are picked on the mesh arrays, then all of them get merged into quads in one op
+        # from_mesh keeps the edge order so the indices carry over
+        sharedEdges = pairTriangles(mesh.data)
+        if len(sharedEdges):
+            bm.edges.ensure_lookup_table()
+            bmesh.ops.dissolve_edges(
+                bm,
+                edges=[bm.edges[i] for i in sharedEdges.tolist()],
+                use_verts=False,
+                use_face_split=False
+            )
     
     if mapSettings.mergeVertices:
         # Merge vertices by distance
@@ -95,7 +143,12 @@ class BlenderTree:
         self.removeQueue = set()
         self.joinMeshes = mapSettings.joinMeshes
         self.useInstancing = mapSettings.useInstancing
+        self.instancingMode = mapSettings.instancingMode
         self.mapSettings = mapSettings
+        self.fixedMeshes = {}
+        self.prototypesCol = None
+        self.prototypes = {}
+        self.pointsNodeGroup = None
 
     def addQueueRoot(self, col):
         self.cloneQueue.setdefault(col, {})
@@ -148,10 +201,14 @@ class BlenderTree:
 
     def startQueues(self):
         UIUtil.log("Copying objects")
+        start = time.perf_counter()
+        copies = 0
         for col in self.cloneQueue:
             for obj in self.cloneQueue[col]:
                 for instance in self.cloneQueue[col][obj]:
                     self.recursiveCopy(obj, instance.parent, False, col, instance.rec)
+                    copies += 1
+        logRate("Copied {} instances".format(copies), copies, start)
 
         #bpy.data.batch_remove(self.removeQueue)
         #bpy.data.batch_remove(matTree.unusedMaterials)
@@ -160,9 +217,41 @@ class BlenderTree:
             objs+=len(self.linkQueue[col])
 
         UIUtil.log("Linking {} objects".format(objs))
+        start = time.perf_counter()
         for col in self.linkQueue:
             for obj in self.linkQueue[col]:
                 col.objects.link(obj)
+        logRate("Linked {} objects".format(objs), objs, start)
+
+    def fixModelTopology(self, model):
+        # the same model shows up again in other entities, those reuse the mesh that was already fixed
+        # the originals never get bound or linked as they are, every look works on a copy of the data
+        # with deduplicateMeshes several meshes of a model can share one datablock, so that only gets fixed once
+        # and replaced data is only removed after every mesh got swapped, once nothing uses it anymore
+        settings = (self.mapSettings.fixTopology, self.mapSettings.mergeVertices, self.mapSettings.mergeDistance)
+        processed = set()
+        replaced = {}
+        for i, mesh in enumerate(model.meshes):
+            key = (model.meshData.GUID, i) + settings
+            fixed = self.fixedMeshes.get(key)
+            if fixed is None:
+                if mesh.data.as_pointer() not in processed:
+                    process_mesh_topology(mesh, self.mapSettings)
+                    processed.add(mesh.data.as_pointer())
+                self.fixedMeshes[key] = mesh.data
+            elif mesh.data != fixed:
+                replaced.setdefault(mesh.data.as_pointer(), mesh.data)
+                mesh.data = fixed
+
+        for unfixed in replaced.values():
+            if unfixed.users == 0:
+                bpy.data.meshes.remove(unfixed)
+
+    def fixEntityTopology(self, entity):
+        if entity.baseModel:
+            self.fixModelTopology(entity.baseModel)
+        for child in entity.children:
+            self.fixEntityTopology(child)
 
     def createModelHierarchy(self, model, name):
         rootFolder = model.armature if model.armature else BLUtils.createFolder(name, False)
@@ -274,7 +363,7 @@ class BlenderTree:
             mod.object = parent
 
         # Set transforms
-        if rec:
+        if rec is not None:
             self.applyRec(new_obj, rec)
 
         # Retarget hardpoint constraints
@@ -297,10 +386,52 @@ class BlenderTree:
 
         return new_obj
 
+    def instanceRecords(self, obj, parent, col, records, name):
+        if len(records) == 0:
+            return
+        if self.instancingMode == 'POINTS':
+            self.instanceOnPoints(obj, parent, col, records, name)
+            return
+        if self.instancingMode == 'COLLECTION':
+            self.instanceCollection(obj, parent, col, records, name)
+            return
+        for i, rec in enumerate(recordTransforms(records)):
+            if i == 0:
+                self.applyRec(obj, rec, True, col)
+                continue
+            self.queueClone(obj, parent, col, rec)
+
+    def prototypeCollection(self, obj, name):
+        # the untransformed hierarchy linked once into its own collection, shared by everything instancing it
+        if obj not in self.prototypes:
+            prototypeCol = bpy.data.collections.new('{}_PROTOTYPE'.format(name))
+            self.prototypesCol.children.link(prototypeCol)
+            self.addQueueRoot(prototypeCol)
+            self.queueLinkRecursive(obj, prototypeCol)
+            self.prototypes[obj] = prototypeCol
+        return self.prototypes[obj]
+
+    def instanceOnPoints(self, obj, parent, col, records, name):
+        if self.pointsNodeGroup is None:
+            self.pointsNodeGroup = BLInstancing.createPointsNodeGroup()
+        pointsObj = BLInstancing.createInstancePoints('{}_INSTANCES'.format(name), BLUtils.recordTransforms(records), self.prototypeCollection(obj, name), *self.pointsNodeGroup)
+        pointsObj.parent = parent
+        self.queueLink(pointsObj, col)
+
+    def instanceCollection(self, obj, parent, col, records, name):
+        # an empty per record instancing the prototype, nothing under it gets copied
+        prototypeCol = self.prototypeCollection(obj, name)
+        for rec in recordTransforms(records):
+            empty = bpy.data.objects.new(name, None)
+            empty.instance_type = 'COLLECTION'
+            empty.instance_collection = prototypeCol
+            empty.parent = parent
+            self.applyRec(empty, rec)
+            self.queueLink(empty, col)
+
     def applyRec(self, obj, rec, queueLink=False, col=None):
-        obj.location = BLUtils.pos_matrix(rec.position)
-        obj.rotation_euler = Quaternion(BLUtils.wxzy(rec.rotation)).to_euler('XYZ')
-        obj.scale = BLUtils.xpzy(rec.scale)
+        # rec is a (location, rotation, scale) from recordTransforms, already in blender space
+        obj.location, obj.rotation_euler, obj.scale = rec
         if queueLink:
             self.queueLinkRecursive(obj, col)
 
@@ -311,7 +442,7 @@ def init(mapTree, mapName, mapRootPath, mapSettings, modelSettings, entitySettin
     blenderTree = BlenderTree(mapSettings)
     
     UIUtil.setStatus("Loading materials")
-    matTree = BlenderMaterialTree(mapTree.modelLookPaths) if modelSettings.importMaterial else None
+    matTree = BlenderMaterialTree(mapTree.modelLookPaths, parallel=mapSettings.parallelParsing) if modelSettings.importMaterial else None
     sceneCol = bpy.context.view_layer.active_layer_collection.collection
     rootMapCol = bpy.data.collections.new(mapName)
     sceneCol.children.link(rootMapCol)
@@ -326,91 +457,84 @@ def init(mapTree, mapName, mapRootPath, mapSettings, modelSettings, entitySettin
         lightsCol = bpy.data.collections.new('{}_LIGHTS'.format(mapName))
         blenderTree.addQueueRoot(lightsCol)
 
-    models = len(mapTree.objects)-1
-    for i,objID in enumerate(mapTree.objects):
-        UIUtil.consoleProgressBar("Loading models", i, models, caller="BLMap")
-        # create a "folder" for this model
-        objFolder = None
-        isEntity = mapTree.modelFilepaths[objID].endswith(".owentity")
-
-        if isEntity:
-            objModel = BLEntity.readEntity(mapTree.modelFilepaths[objID], modelSettings, entitySettings)
-            if objModel is None: continue # not found
+    if mapSettings.instancingMode != 'OBJECTS':
+        blenderTree.prototypesCol = bpy.data.collections.new('{}_PROTOTYPES'.format(mapName))
+
+    trees = None
+    if mapSettings.parallelParsing:
+        # workers read and decode the upcoming models while this loop builds blender data for the current one
+        trees = Prefetch.streamModels([mapTree.modelFilepaths[objID] for objID in mapTree.objects], BLModel.meshStreams(modelSettings), entitySettings.importChildren, mapSettings.prefetchDepth)
+
+    # closed right after the loop, a suspended generator would keep the workers around until it gets collected
+    try:
+        models = len(mapTree.objects)-1
+        for i,objID in enumerate(mapTree.objects):
+            prefetched = next(trees) if trees else None
+            UIUtil.consoleProgressBar("Loading models", i, models, caller="BLMap")
+            # create a "folder" for this model
+            objFolder = None
+            isEntity = mapTree.modelFilepaths[objID].endswith(".owentity")
+
+            if isEntity:
+                objModel = BLEntity.readEntity(mapTree.modelFilepaths[objID], modelSettings, entitySettings, prefetched=prefetched)
+                if objModel is None: continue # not found
             
-            # Fix topology for entity and its children if enabled
-            if mapSettings.fixTopology:
-                def fix_entity_topology(entity):
-                    if entity.baseModel:
-                        import bmesh
-                        for mesh in entity.baseModel.meshes:
-                            process_mesh_topology(mesh, mapSettings)
-                    
-                    # Recursively fix topology for children
-                    for child in entity.children:
-                        fix_entity_topology(child)
-                
-                # Start fixing topology from the root entity
-                fix_entity_topology(objModel)
+                # Fix topology for entity and its children if enabled
+                if mapSettings.fixTopology:
+                    blenderTree.fixEntityTopology(objModel)
             
-            modelFolder = blenderTree.createEntityHierarchy(objModel, objID)
-            if modelFolder is None:
-                continue
-        else:
-            objModel = BLModel.readMDL(mapTree.modelFilepaths[objID], modelSettings)
-            if objModel is None: continue # not found
+                modelFolder = blenderTree.createEntityHierarchy(objModel, objID)
+                if modelFolder is None:
+                    continue
+            else:
+                objModel = BLModel.readMDL(mapTree.modelFilepaths[objID], modelSettings, prefetched)
+                if objModel is None: continue # not found
             
-            # Fix topology and merge vertices for each mesh if enabled
-            if mapSettings.fixTopology or mapSettings.mergeVertices:
-                import bmesh
-                for mesh in objModel.meshes:
-                    process_mesh_topology(mesh, mapSettings)
+                # Fix topology and merge vertices for each mesh if enabled
+                if mapSettings.fixTopology or mapSettings.mergeVertices:
+                    blenderTree.fixModelTopology(objModel)
             
-            modelFolder = blenderTree.createModelHierarchy(objModel, objID)
-
-        for objLookID in mapTree.objects[objID]:
-            if objFolder is None:
-                objFolder = bpy.data.collections.new('{}_COLLECTION'.format(objID))
-                blenderTree.addQueueRoot(objFolder)
-                objCol = objectsCol if objID not in mapTree.details else detailsCol
-                objCol.children.link(objFolder)
-
-            if modelSettings.importMaterial:
-                # create a "folder" for the material
-                lookFolder = BLUtils.createFolder('{}_LOOK'.format(objLookID if objLookID else "null"))  # maybe make this a collection
-                objFolder.objects.link(lookFolder)
-
-                if objLookID:
-                    if isEntity:
-                        matTree.bindEntityLook(objModel, objLookID)
-                    else:
-                        #UIUtil.log("Binding material look {} to model group {}".format(objLookID, objID))
-                        matTree.bindModelLook(objModel, objLookID)
-
-                lookModel = blenderTree.recursiveCopy(modelFolder, lookFolder, True, objFolder)
-
-                if mapSettings.joinMeshes:
-                    if not isEntity:
-                        lookModel = blenderTree.joinModelMeshes(lookModel)
-                        lookModel.parent = lookFolder
-                    else:
-                        lookModel = blenderTree.joinEntityMeshes(objModel, lookModel)
-                        lookModel.parent = lookFolder
+                modelFolder = blenderTree.createModelHierarchy(objModel, objID)
+
+            for objLookID in mapTree.objects[objID]:
+                if objFolder is None:
+                    objFolder = bpy.data.collections.new('{}_COLLECTION'.format(objID))
+                    blenderTree.addQueueRoot(objFolder)
+                    objCol = objectsCol if objID not in mapTree.details else detailsCol
+                    objCol.children.link(objFolder)
+
+                if modelSettings.importMaterial:
+                    # create a "folder" for the material
+                    lookFolder = BLUtils.createFolder('{}_LOOK'.format(objLookID if objLookID else "null"))  # maybe make this a collection
+                    objFolder.objects.link(lookFolder)
+
+                    if objLookID:
+                        if isEntity:
+                            matTree.bindEntityLook(objModel, objLookID)
+                        else:
+                            #UIUtil.log("Binding material look {} to model group {}".format(objLookID, objID))
+                            matTree.bindModelLook(objModel, objLookID)
+
+                    lookModel = blenderTree.recursiveCopy(modelFolder, lookFolder, True, objFolder)
+
+                    if mapSettings.joinMeshes:
+                        if not isEntity:
+                            lookModel = blenderTree.joinModelMeshes(lookModel)
+                            lookModel.parent = lookFolder
+                        else:
+                            lookModel = blenderTree.joinEntityMeshes(objModel, lookModel)
+                            lookModel.parent = lookFolder
                     
 
-                for i, rec in enumerate(mapTree.objects[objID][objLookID]):
-                    if i == 0:
-                        blenderTree.applyRec(lookModel, rec, True, objFolder)
-                        continue
-                    blenderTree.queueClone(lookModel, lookFolder, objFolder, rec)
-            else:
-                for i, rec in enumerate(mapTree.objects[objID][objLookID]):
-                    if i == 0:
-                        blenderTree.applyRec(modelFolder, rec, True, objFolder)
-                        continue
-                    blenderTree.queueClone(modelFolder, None, objFolder, rec)
+                    blenderTree.instanceRecords(lookModel, lookFolder, objFolder, mapTree.objects[objID][objLookID], '{}_{}'.format(objID, objLookID if objLookID else "null"))
+                else:
+                    blenderTree.instanceRecords(modelFolder, None, objFolder, mapTree.objects[objID][objLookID], objID)
 
-        if modelSettings.importMaterial:
-            blenderTree.queueRemoveRecursive(modelFolder)
+            if modelSettings.importMaterial:
+                blenderTree.queueRemoveRecursive(modelFolder)
+    finally:
+        if trees:
+            trees.close()
 
     if modelSettings.importMaterial: # cleanup
         UIUtil.log("cleaning up...")
@@ -464,6 +588,9 @@ def init(mapTree, mapName, mapRootPath, mapSettings, modelSettings, entitySettin
     if mapSettings.importDetails:
         rootMapCol.children.link(detailsCol)
 
+    if blenderTree.prototypesCol is not None:
+        rootMapCol.children.link(blenderTree.prototypesCol)
+
     if modelSettings.importMaterial and modelSettings.saveMaterialDB:
         objects = [obj for childFolder in rootMapCol.children for objFolder in childFolder.children for obj in objFolder.objects]
         matTree.createMaterialDatabase(objects, mapRootPath)
@@ -471,4 +598,8 @@ def init(mapTree, mapName, mapRootPath, mapSettings, modelSettings, entitySettin
     if mapSettings.importLights and mapTree.lights:
         rootMapCol.children.link(lightsCol)
 
+    # needs the layer collection, so only once it's linked
+    if blenderTree.prototypesCol is not None:
+        BLInstancing.excludeCollection(blenderTree.prototypesCol)
+
     UIUtil.setStatus(None)
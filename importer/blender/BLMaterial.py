@@ -1,4 +1,5 @@
 import bpy
+import copy
 import json 
 
 from ...readers import OWMaterialReader, PathUtil
@@ -8,7 +9,7 @@ from ...datatypes import MaterialTypes
 from ...ui import LibraryHandler, UIUtil
 
 class BlenderMaterialTree:
-    def __init__(self, modelLooks, dedup=False):
+    def __init__(self, modelLooks, dedup=False, parallel=False):
         self.materialLooks = {}
         self.materials = {}
         self.blendMaterials = {}
@@ -21,22 +22,27 @@ class BlenderMaterialTree:
         self.unusedMaterials = set()
         self.blendNodeGroups = LibraryHandler.load_data()
         UIUtil.log("Reading material looks")
-        self.batchLoadMaterials(modelLooks)
+        self.batchLoadMaterials(modelLooks, parallel)
         UIUtil.log("Creating {} materials".format(len(self.materials)))
         self.createMaterials()
 
-    def batchLoadMaterials(self, modelLooks):
+    def batchLoadMaterials(self, modelLooks, parallel=False):
         read = set()
+        lookData = OWMaterialReader.readModelLooks((modelLookPath for modelLookGUID, modelLookPath in modelLooks.items() if modelLookGUID is not None), parallel)
         for modelLookGUID, modelLookPath in modelLooks.items():
             if modelLookGUID is None: continue
             if modelLookGUID not in read:
-                modelLookData = OWMaterialReader.read(modelLookPath)
+                modelLookData = lookData[modelLookPath]
                 if not modelLookData:
                     continue
                 if type(modelLookData) == MaterialTypes.OWMATMaterial:
                     mats= {"virtual": modelLookData}
                     modelLookData = MaterialTypes.OWMATModelLook("virtual")
                     modelLookData.materials = mats
+                else:
+                    # two GUIDs can share a look file, the GUIDs go into a copy
+                    modelLookData = copy.copy(modelLookData)
+                    modelLookData.materials = dict(modelLookData.materials)
 
                 for key, material in modelLookData.materials.items():
                     if not material:
@@ -1,12 +1,15 @@
-import itertools
+import hashlib
 import random
 
+import numpy
+
 import bpy
 from mathutils import *
 from math import radians
 
 
 from . import BLUtils
+from ...ui import UIUtil
 from ...datatypes.ModelTypes import ModelData
 from ...readers import OWModelReader
 
@@ -72,79 +75,188 @@ def importEmpties(meshData, armature=None, blendBones=[]):
     return socketsFolder, empties
 
 
-def importArmature(meshData):  # honestly fuck this 2x
+def restMatrices(bones):
+    # (N, 4, 4) armature space rest matrices, refpose transforms are relative to the parent
+    # parents get resolved one hierarchy level at a time so every level is a single batched matmul
+    count = len(bones)
+    parents = numpy.array([bone.parent for bone in bones], dtype=numpy.intp).reshape(count)
+    matrices = numpy.zeros((count, 4, 4))
+    matrices[:, :3, :3] = BLUtils.eulersToMatrices([bone.rot for bone in bones])
+    matrices[:, :3, 3] = numpy.array([bone.pos for bone in bones], dtype=numpy.float64).reshape(count, 3)
+    matrices[:, 3, 3] = 1
+
+    hasParent = parents != -1
+    depth = numpy.zeros(count, dtype=numpy.intp)
+    for _ in range(count):
+        newDepth = numpy.where(hasParent, depth[parents] + 1, 0)
+        if (newDepth == depth).all():
+            break
+        depth = newDepth
+
+    for level in range(1, depth.max(initial=0) + 1):
+        children = numpy.flatnonzero(depth == level)
+        matrices[children] = matrices[parents[children]] @ matrices[children]
+    return numpy.array(GLOBAL_ROTATION) @ matrices
+
+
+# armature data is shared between models with the same skeleton, found through these custom properties
+SKELETON_KEY = "owm.skeleton.key"
+SKELETON_BONES = "owm.skeleton.bones"
+
+def skeletonKey(bones):
+    key = hashlib.sha1()
+    for bone in bones:
+        key.update(repr((bone.name, bone.parent, tuple(bone.pos), tuple(bone.scale), tuple(bone.rot))).encode("utf-8"))
+    return key.hexdigest()
+
+
+def boneEnds(bones, matrices):
+    # blender removes zero-length bones, bones point along their y axis
+    lengths = numpy.array([.001 if bone.parent != -1 else .05 for bone in bones]).reshape(-1, 1)
+    heads = matrices[:, :3, 3]
+    return heads, heads + matrices[:, :3, 1] * lengths
+
+
+def matchesSkeleton(armData, bones, heads, tails):
+    # the key gets copied along with the datablock and survives edits to it, so check the bones themselves
+    names = armData.get(SKELETON_BONES)
+    if armData.is_editmode or names is None or len(names) != len(bones) or len(armData.bones) != len(bones):
+        return False
+    order = {bone.name: i for i, bone in enumerate(armData.bones)}
+    if any(name not in order for name in names):
+        return False
+    for name, bone in zip(names, bones):
+        parent = armData.bones[name].parent
+        if (parent.name if parent else None) != (names[bone.parent] if bone.parent != -1 else None):
+            return False
+
+    count = len(bones)
+    blendHeads = numpy.empty(count * 3, dtype=numpy.float32)
+    blendTails = numpy.empty(count * 3, dtype=numpy.float32)
+    armData.bones.foreach_get("head_local", blendHeads)
+    armData.bones.foreach_get("tail_local", blendTails)
+    index = [order[name] for name in names]
+    return numpy.allclose(blendHeads.reshape(count, 3)[index], heads, atol=1e-4) and numpy.allclose(blendTails.reshape(count, 3)[index], tails, atol=1e-4)
+
+
+def findArmatureData(key, bones, heads, tails):
+    return next((armData for armData in bpy.data.armatures if armData.get(SKELETON_KEY) == key and matchesSkeleton(armData, bones, heads, tails)), None)
+
+
+def importArmature(meshData):
     restPoseBones = meshData.refPoseBones
+    matrices = restMatrices(restPoseBones)
+    heads, tails = boneEnds(restPoseBones, matrices)
+    key = skeletonKey(restPoseBones)
+    armData = findArmatureData(key, restPoseBones, heads, tails)
+    if armData is not None:
+        armature = bpy.data.objects.new('Armature', armData)
+        armature.show_in_front = True
+        return armature, list(armData[SKELETON_BONES])
 
-    armature = None
     armData = bpy.data.armatures.new('Armature')
     armData.display_type = 'STICK'
     armature = bpy.data.objects.new('Armature', armData)
     armature.show_in_front = True
 
+    # edit bones need the armature in edit mode, that's the only mode switch
     BLUtils.linkScene(armature)
-
     BLUtils.setActive(armature)
-    bpy.ops.object.editmode_toggle()
+    bpy.ops.object.mode_set(mode='EDIT', toggle=False)
 
-    matrices = {}
-    blendBoneNames = []
-    for bone in restPoseBones:
+    blendBones = []
+    for bone, matrix, head, tail in zip(restPoseBones, matrices, heads, tails):
         blendBone = armData.edit_bones.new(bone.name)
         blendBone.inherit_scale = 'NONE'
-        blendBone.tail = 0, 0.05, 0  # Blender removes zero-length bones
-        blendBoneNames.append(blendBone.name)
-
-        mpos = Matrix.Translation(bone.pos)
-        mrot = Euler(bone.rot).to_matrix().to_4x4()
-        matrices[bone.name] = mpos @ mrot
+        blendBones.append(blendBone)
+        blendBone.head = head
+        blendBone.tail = tail
+        blendBone.align_roll(matrix[:3, 2])
 
-    for i, bone in enumerate(restPoseBones):
+    for blendBone, bone in zip(blendBones, restPoseBones):
         if bone.parent != -1:
-            blendBone = armData.edit_bones[i]
-            blendBone.parent = armature.data.edit_bones[bone.parent]
-            blendBone.tail = blendBone.head + (blendBone.tail - blendBone.head).normalized() * .001
-
-    # Pose the skeleton by applying the computed matrices.
-    bpy.context.view_layer.objects.active = armature
-    bpy.ops.object.posemode_toggle()
+            blendBone.parent = blendBones[bone.parent]
 
-    for bone in armature.pose.bones:
-        bone.matrix_basis.identity()
-        bone.matrix = matrices[bone.name]
-
-    bpy.ops.pose.armature_apply()
-    bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-    armature.data.transform(GLOBAL_ROTATION)
-
-    # convince blender 4.x that it has actually rotated :D
-    bpy.ops.object.mode_set(mode='EDIT', toggle=False)
+    # names before leaving edit mode, the edit bones are gone after that
+    blendBoneNames = [blendBone.name for blendBone in blendBones]
     bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-
     BLUtils.unlinkScene(armature)
-    return armature, blendBoneNames
 
+    armData[SKELETON_KEY] = key
+    armData[SKELETON_BONES] = blendBoneNames
+    return armature, blendBoneNames
 
-def makeVertexGroups(mesh, meshData, blendBoneNames):
-    # store weights per bone
-    boneMap = {}
-
-    # loop through all vertices
-    for vertexIndex, indices in enumerate(meshData.boneIndices):
-        for index, boneIndex in enumerate(indices):
-            boneWeight = meshData.boneWeights[vertexIndex][index]
 
-            if boneWeight != 0 and boneIndex != -1 and boneIndex < len(blendBoneNames):
-                boneName = blendBoneNames[boneIndex]
-                boneMap.setdefault(boneName, {})
-                boneMap[boneName].setdefault(boneWeight, [])
-                boneMap[boneName][boneWeight].append(vertexIndex)
+# past this many different weights on one bone they get rounded to 8 bits, caps the add calls per bone
+MAX_WEIGHT_GROUPS = 256
 
-    for boneName in boneMap:
+def makeVertexGroups(mesh, meshData, blendBoneNames):
+    # there's no bulk weight setter in the python api, VertexGroup.add takes one weight for a list of vertices
+    # so the vertices get grouped per bone and weight here and each group is one add call
+    if len(meshData.boneIndices) == 0:
+        return
+    indices = numpy.asarray(meshData.boneIndices, dtype=numpy.int64).reshape(len(meshData.boneIndices), -1)
+    weights = numpy.asarray(meshData.boneWeights, dtype=numpy.float32).reshape(indices.shape)
+    vertices = numpy.repeat(numpy.arange(len(indices)), indices.shape[1])
+    indices = indices.ravel()
+    weights = weights.ravel()
+
+    keep = (weights != 0) & (indices >= 0) & (indices < len(blendBoneNames))
+    indices, weights, vertices = indices[keep], weights[keep], vertices[keep]
+
+    # groups get created in the order the bones first show up, like before
+    bones, firstSeen = numpy.unique(indices, return_index=True)
+
+    order = numpy.argsort(indices, kind="stable")
+    weights, vertices = weights[order], vertices[order]
+    starts = numpy.searchsorted(indices[order], bones)
+    ends = numpy.append(starts[1:], len(order))
+
+    for i in numpy.argsort(firstSeen).tolist():
+        boneWeights, boneVertices = weights[starts[i]:ends[i]], vertices[starts[i]:ends[i]]
+        if len(numpy.unique(boneWeights)) > MAX_WEIGHT_GROUPS:
+            # nothing rounds down to 0 so every vertex stays in the group
+            boneWeights = numpy.maximum(numpy.round(boneWeights * 255), 1) / 255
+        values, firstWeight, groups = numpy.unique(boneWeights, return_index=True, return_inverse=True)
+
+        boneName = blendBoneNames[bones[i]]
         vgrp = mesh.vertex_groups.get(boneName)
         if vgrp is None:
             vgrp = mesh.vertex_groups.new(name=boneName)
-        for boneWeight in boneMap[boneName]:
-            vgrp.add(boneMap[boneName][boneWeight], boneWeight, 'REPLACE')
+
+        # added in the order the weights first show up like before, that decides which weight a vertex listing the same bone twice keeps
+        groupOrder = numpy.argsort(groups, kind="stable")
+        splits = numpy.cumsum(numpy.bincount(groups, minlength=len(values)))[:-1]
+        vertexGroups = numpy.split(boneVertices[groupOrder], splits)
+        for j in numpy.argsort(firstWeight).tolist():
+            vgrp.add(vertexGroups[j].tolist(), values[j].item(), 'REPLACE')
+
+
+def buildMesh(mesh, vertices, triangles):
+    # same result as from_pydata(vertices, [], triangles) with everything smooth, but straight from the arrays
+    vertices = numpy.asarray(vertices, dtype=numpy.float32).reshape(-1, 3)
+    corners = numpy.asarray(triangles, dtype=numpy.int32).ravel()
+    faceCount = len(corners) // 3
+
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set("co", vertices.ravel())
+    mesh.loops.add(len(corners))
+    mesh.loops.foreach_set("vertex_index", corners)
+    mesh.polygons.add(faceCount)
+    mesh.polygons.foreach_set("loop_start", numpy.arange(0, len(corners), 3, dtype=numpy.int32))
+    if bpy.app.version < (4,0,0): # read only since 4.0, comes from loop_start
+        mesh.polygons.foreach_set("loop_total", numpy.full(faceCount, 3, dtype=numpy.int32))
+    mesh.polygons.foreach_set("use_smooth", numpy.ones(faceCount, dtype=bool))
+    mesh.update(calc_edges=True)
+
+
+def setCustomNormals(mesh, meshData):
+    normals = meshData.normals
+    if len(normals) != len(mesh.vertices):
+        UIUtil.log("Skipping custom normals for {}: {} normals for {} vertices".format(meshData.name, len(normals), len(mesh.vertices)))
+        return
+    # zero length normals (from zero length source normals) fall back to the computed ones
+    mesh.normals_split_custom_set_from_vertices(normals)
 
 
 def importMesh(meshData, modelSettings, armature, blendBoneNames, index, unTriangulate, data, existing_meshes):
@@ -157,8 +269,7 @@ def importMesh(meshData, modelSettings, armature, blendBoneNames, index, unTrian
             mesh = bpy.data.meshes.new(meshData.name)
             mesh["owm.materialKey"] = str(meshData.materialKey)
             obj = bpy.data.objects.new(mesh.name, mesh)
-            mesh.from_pydata(meshData.vertices, [], meshData.indices)
-            mesh.polygons.foreach_set('use_smooth', [True] * len(mesh.polygons))
+            buildMesh(mesh, meshData.vertices, meshData.indices)
 
             if armature:
                 mod = obj.modifiers.new(type='ARMATURE', name='OWM Skeleton')
@@ -174,7 +285,12 @@ def importMesh(meshData, modelSettings, armature, blendBoneNames, index, unTrian
 
                     vertexGroups = obj.vertex_groups.keys()
                     poseBones = armature.pose.bones
-                    boneCollection = armature.data.collections.new(mesh.name)
+                    # bone collections live on the armature data, data shared with other models keeps the ones it has
+                    boneCollection = None
+                    if armature.data.users == 1:
+                        boneCollection = armature.data.collections.get(mesh.name)
+                        if boneCollection is None:
+                            boneCollection = armature.data.collections.new(mesh.name)
 
                     # https://docs.blender.org/api/current/bpy.types.BoneColor.html, only goes up to THEME20
                     # max((n%20) + 1) gives 20
@@ -182,7 +298,8 @@ def importMesh(meshData, modelSettings, armature, blendBoneNames, index, unTrian
 
                     for boneName in vertexGroups:
                         poseBones[boneName].color.palette = 'THEME{:02d}'.format(themeI+1)
-                        boneCollection.assign(poseBones[boneName])
+                        if boneCollection is not None:
+                            boneCollection.assign(poseBones[boneName])
                 else:
                     boneGroup = armature.pose.bone_groups.new(name=obj.name)
                     boneGroup.color_set = 'CUSTOM'
@@ -197,8 +314,8 @@ def importMesh(meshData, modelSettings, armature, blendBoneNames, index, unTrian
 
             for i in range(meshData.uvCount):
                 layer = mesh.uv_layers.new(name='UVMap%d' % (i + 1))
-                uv = meshData.uvs[i]
-                layer.uv.foreach_set("vector", list(itertools.chain.from_iterable(uv)))
+                # already per face corner and contiguous, so this is a view
+                layer.uv.foreach_set("vector", meshData.uvs[i].ravel())
 
             if modelSettings.importColor and len(meshData.color1) > 0:
                 layer = mesh.color_attributes.new("ColorMap1", 'BYTE_COLOR', 'POINT')
@@ -206,22 +323,20 @@ def importMesh(meshData, modelSettings, armature, blendBoneNames, index, unTrian
                 layer = mesh.color_attributes.new("ColorMap2", 'BYTE_COLOR', 'POINT')
                 layer.data.foreach_set("color", meshData.color2)
             mesh.update()
-            if unTriangulate:
-                unTriangulateMesh(mesh, meshData, data, modelSettings)
 
             if bpy.app.version < (4,1,0):
                 mesh.use_auto_smooth = modelSettings.autoSmoothNormals
+            # before unTriangulate, merging vertices there is what broke the vertex count match
             if modelSettings.importNormals:
                 if bpy.app.version < (4,1,0):
                     mesh.create_normals_split()
                 mesh.validate(clean_customdata=False)
-                mesh.update(calc_edges=True)
-                # if len(meshData.normals) == len(mesh.vertices): # Removed this check
-                #     mesh.normals_split_custom_set_from_vertices(meshData.normals)
-                # else:
-                #     print(f"Warning: Number of normals ({len(meshData.normals)}) does not match number of vertices ({len(mesh.vertices)}) for mesh {meshData.name}. Skipping custom normals.")
+                setCustomNormals(mesh, meshData)
             else:
                 mesh.validate()
+
+            if unTriangulate:
+                unTriangulateMesh(mesh, meshData, data, modelSettings)
             if modelSettings.deduplicateMeshes:
                 existing_meshes[mesh_key] = mesh
             return obj
@@ -253,9 +368,25 @@ def unTriangulateMesh(mesh, meshData, data, modelSettings):
     mesh.update()
 
 
-def readMDL(filename, modelSettings):
-    data = OWModelReader.read(filename)
+def meshStreams(modelSettings):
+    # the mesh streams importMesh is going to touch with these settings
+    streams = ["vertices", "indices", "uvs"]
+    if modelSettings.importNormals:
+        streams += ["normals"]
+    if modelSettings.importColor:
+        streams += ["color1", "color2"]
+    if modelSettings.importSkeleton:
+        streams += ["boneIndices", "boneWeights"]
+    return streams
+
+
+def readMDL(filename, modelSettings, prefetched=None):
+    data = prefetched.get(filename) if prefetched else None
+    if not data:
+        data = OWModelReader.read(filename, arrays=True)
     if not data: return None
+    # a copy, the reader's result can be shared through the session cache and the processed streams shouldn't stick to it
+    data = data.detached(meshStreams(modelSettings))
 
     unTriangulate = modelSettings.get("unTriangulate", False)
 
@@ -1,6 +1,9 @@
 import bpy
 import bpy_extras
 import mathutils
+import numpy
+
+from ...datatypes import MapTypes
 
 acm = bpy_extras.io_utils.axis_conversion(from_forward='-Z', from_up='Y').to_4x4()
 
@@ -37,6 +40,58 @@ def pos_matrix(pos):
     mtx = acm @ posMtx
     return mtx.to_translation()
 
+def quaternionsToEuler(quats):
+    # (N, 4) wxyz -> (N, 3) XYZ euler, numpy port of what Quaternion.to_euler('XYZ') does
+    quats = numpy.asarray(quats, dtype=numpy.float64)
+    lengths = numpy.linalg.norm(quats, axis=1, keepdims=True)
+    quats = numpy.divide(quats, lengths, out=numpy.zeros_like(quats), where=lengths > 0)
+    quats[lengths[:, 0] == 0, 1] = 1.0 # same fallback as blender's normalize_qt
+
+    # quat_to_mat3, m[column][row] like blender
+    q0, q1, q2, q3 = (numpy.sqrt(2.0) * quats).T
+    qda, qdb, qdc = q0*q1, q0*q2, q0*q3
+    qaa, qab, qac = q1*q1, q1*q2, q1*q3
+    qbb, qbc, qcc = q2*q2, q2*q3, q3*q3
+    m00, m01, m02 = 1.0 - qbb - qcc, qdc + qab, qac - qdb
+    m12, m22 = qda + qbc, 1.0 - qaa - qbb
+    m11, m21 = 1.0 - qaa - qcc, qbc - qda
+
+    # mat3_normalized_to_eul, two solutions and the one with the smaller total wins
+    cy = numpy.hypot(m00, m01)
+    gimbal = cy <= 16 * numpy.finfo(numpy.float32).eps
+    eul1 = numpy.stack((
+        numpy.where(gimbal, numpy.arctan2(-m21, m11), numpy.arctan2(m12, m22)),
+        numpy.arctan2(-m02, cy),
+        numpy.where(gimbal, 0.0, numpy.arctan2(m01, m00))), axis=1)
+    eul2 = numpy.stack((
+        numpy.arctan2(-m12, -m22),
+        numpy.arctan2(-m02, -cy),
+        numpy.arctan2(-m01, -m00)), axis=1)
+    eul2[gimbal] = eul1[gimbal]
+    useSecond = numpy.abs(eul1).sum(axis=1) > numpy.abs(eul2).sum(axis=1)
+    return numpy.where(useSecond[:, None], eul2, eul1)
+
+def eulersToMatrices(eulers):
+    # (N, 3) XYZ euler -> (N, 3, 3), same as Euler(...).to_matrix() per row
+    x, y, z = numpy.asarray(eulers, dtype=numpy.float64).reshape(-1, 3).T
+    cx, cy, cz = numpy.cos(x), numpy.cos(y), numpy.cos(z)
+    sx, sy, sz = numpy.sin(x), numpy.sin(y), numpy.sin(z)
+    cc, cs, sc, ss = cx*cz, cx*sz, sx*cz, sx*sz
+    return numpy.stack((
+        numpy.stack((cy*cz, sy*sc - cs, sy*cc + ss), axis=1),
+        numpy.stack((cy*sz, sy*ss + cc, sy*cs - sc), axis=1),
+        numpy.stack((-sy, cy*sx, cy*cx), axis=1)), axis=1)
+
+def recordTransforms(records):
+    # blender locations, XYZ eulers and scales for a (N, 10) map record array in one go
+    # same as pos_matrix, Quaternion(wxzy(...)).to_euler('XYZ') and xpzy per record
+    records = numpy.asarray(records, dtype=numpy.float64).reshape(-1, MapTypes.RECORD_WIDTH)
+    locations = records[:, MapTypes.RECORD_POSITION] @ numpy.array(acm.to_3x3()).T
+    rot = records[:, MapTypes.RECORD_ROTATION]
+    rotations = quaternionsToEuler(numpy.stack((rot[:, 3], rot[:, 0], -rot[:, 2], rot[:, 1]), axis=1))
+    scales = records[:, MapTypes.RECORD_SCALE][:, (0, 2, 1)]
+    return locations, rotations, scales
+
 def rotateLight(blendLightObj, lightData):
     blendLightObj.rotation_euler = mathutils.Quaternion(wxzy(lightData.rotation)).to_euler('XYZ')
     blendLightObj.rotation_euler.x -= 1.5708
@@ -68,6 +123,15 @@ def linkScene(obj, collection=None):
         collection = bpy.context.view_layer.active_layer_collection.collection
     collection.objects.link(obj)
 
+def findLayerCollection(layerCollection, collection):
+    if layerCollection.collection == collection:
+        return layerCollection
+    for child in layerCollection.children:
+        found = findLayerCollection(child, collection)
+        if found is not None:
+            return found
+    return None
+
 def unlinkScene(obj, collection=None):
     if collection is None:
         collection = bpy.context.view_layer.active_layer_collection.collection
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy
+
+from ..ui import UIUtil
+
+# parsed reader output, keyed by path + size + mtime so an edited file just misses
+# two layers: recently used results stay in memory for the session, optionally it also goes to disk
+# callers share what comes out of here, so don't modify it
+# on disk every entry is an .npz of plain arrays plus a json string of the other fields, never a pickle
+# the folder can be a shared one so loading an entry must not be able to run code
+# readers pass pack(data) -> (fields, arrays) and unpack(filename, fields, arrays) -> data for that, unpack goes through
+# the constructors so new attributes get their defaults and a missing field drops the entry
+# bump this whenever a pack layout changes, old disk entries then stop matching
+VERSION = 2
+EXTENSION = ".npz"
+STALE_EXTENSIONS = (".pickle",) # from older versions
+FIELDS = "fields"
+
+folder = None # None: no disk cache
+sizeLimit = 0
+written = 0 # since the last eviction
+
+# bounded by the size of the source files, close enough to what the parsed data takes
+memoryLimit = 512*1024*1024 # 0 turns it off
+memorySize = 0
+memory = OrderedDict() # (path, kind) -> ((size, mtime), data)
+memoryLock = threading.Lock() # the prefetch can fall back to threads
+
+def configure(path, limit):
+    global folder, sizeLimit
+    folder = path or None
+    sizeLimit = limit
+    if folder:
+        removeStale()
+        evict()
+
+def configureMemory(limit):
+    global memoryLimit
+    memoryLimit = limit
+    with memoryLock:
+        trimMemory()
+
+def fileKey(filename):
+    stat = os.stat(filename)
+    return os.path.normcase(os.path.abspath(filename)), (stat.st_size, stat.st_mtime_ns)
+
+def entryPath(path, version, kind):
+    key = "{}|{}|{}|{}|{}".format(path, version[0], version[1], kind, VERSION)
+    return os.path.join(folder, hashlib.sha1(key.encode("utf-8")).hexdigest() + EXTENSION)
+
+def load(filename, kind, unpack=None):
+    try:
+        path, version = fileKey(filename)
+    except OSError:
+        return None
+
+    with memoryLock:
+        entry = memory.get((path, kind))
+        if entry is not None:
+            if entry[0] == version:
+                memory.move_to_end((path, kind))
+                return entry[1]
+            forget((path, kind))
+
+    if not folder or unpack is None:
+        return None
+    data = loadEntry(filename, entryPath(path, version, kind), unpack)
+    if data:
+        remember(path, version, kind, data)
+    return data
+
+def store(filename, kind, data, pack=None):
+    try:
+        path, version = fileKey(filename)
+    except OSError:
+        return
+    remember(path, version, kind, data)
+    if folder and pack is not None:
+        storeEntry(filename, entryPath(path, version, kind), pack(data))
+
+def remember(path, version, kind, data):
+    global memorySize
+    if version[0] > memoryLimit:
+        return
+    with memoryLock:
+        forget((path, kind))
+        memory[(path, kind)] = (version, data)
+        memorySize += version[0]
+        trimMemory()
+
+def forget(key):
+    global memorySize
+    entry = memory.pop(key, None)
+    if entry is not None:
+        memorySize -= entry[0][0]
+
+def trimMemory():
+    while memory and memorySize > memoryLimit:
+        forget(next(iter(memory)))
+
+def flushMemory():
+    global memorySize
+    with memoryLock:
+        count = len(memory)
+        memory.clear()
+        memorySize = 0
+    return count
+
+def loadEntry(filename, path, unpack):
+    try:
+        with numpy.load(path, allow_pickle=False) as entry:
+            fields = json.loads(str(entry[FIELDS]))
+            arrays = {name: entry[name] for name in entry.files if name != FIELDS}
+        data = unpack(filename, fields, arrays)
+        os.utime(path) # mtime doubles as last use for eviction
+        return data
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # half written or from an incompatible layout, drop it and parse again
+        UIUtil.log("Dropping cache entry for {}: {}".format(filename, e))
+        removeEntry(path)
+        return None
+
+def storeEntry(filename, path, packed):
+    global written
+    # write next to it and swap in, workers may be storing at the same time
+    temp = None
+    try:
+        fields, arrays = packed
+        arrays = {name: numpy.asarray(array) for name, array in arrays.items()}
+        if FIELDS in arrays or any(array.dtype.hasobject for array in arrays.values()):
+            raise ValueError("entry would need pickle")
+        os.makedirs(folder, exist_ok=True)
+        handle, temp = tempfile.mkstemp(".tmp", dir=folder)
+        with os.fdopen(handle, "wb") as f:
+            numpy.savez(f, **{FIELDS: numpy.array(json.dumps(fields))}, **arrays)
+        os.replace(temp, path)
+        written += os.path.getsize(path)
+    except Exception as e:
+        UIUtil.log("Could not cache {}: {}".format(filename, e))
+        if temp:
+            removeEntry(temp)
+        return
+    if written > sizeLimit // 8:
+        written = 0
+        evict()
+
+def removeEntry(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def entries():
+    try:
+        with os.scandir(folder) as items:
+            return [(item.stat().st_mtime, item.stat().st_size, item.path) for item in items if item.is_file() and item.name.endswith(EXTENSION)]
+    except OSError:
+        return []
+
+def removeStale():
+    try:
+        with os.scandir(folder) as items:
+            stale = [item.path for item in items if item.is_file() and item.name.endswith(STALE_EXTENSIONS)]
+    except OSError:
+        return
+    for path in stale:
+        removeEntry(path)
+
+def evict():
+    # least recently used first until the folder fits
+    if not folder or sizeLimit <= 0:
+        return
+    items = entries()
+    total = sum(size for _, size, _ in items)
+    if total <= sizeLimit:
+        return
+    items.sort()
+    for _, size, path in items:
+        if total <= sizeLimit:
+            break
+        removeEntry(path)
+        total -= size
+
+def clear():
+    flushMemory()
+    if not folder:
+        return
+    for _, _, path in entries():
+        removeEntry(path)
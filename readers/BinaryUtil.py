@@ -1,5 +1,7 @@
+import itertools
 import struct
 from io import BytesIO
+import numpy
 from . import PathUtil
 from ..ui import UIUtil
 
@@ -21,6 +23,10 @@ def compatibilityCheck(format, major, minor):
     
     return True
 
+def isCompatible(format, major, minor):
+    # compatibilityCheck without the popups
+    return (major, minor) >= format.minimum and major <= format.major
+
 def openStream(filename, extension):
     filename = PathUtil.normPath(filename)
     if not filename.endswith(extension):
@@ -29,27 +35,151 @@ def openStream(filename, extension):
     stream = None
     try:
         with open(filename, 'rb') as f:
-            stream = BinaryFile(f.read())
-            stream.path = PathUtil.pathRoot(filename)
+            stream = BinaryFile(f.read(), PathUtil.pathRoot(filename))
     except:
         UIUtil.fileOpenError()
         UIUtil.log("failed to open file {}".format(filename))
         return None
     return stream
 
-class BinaryFile(BytesIO):
+PROBE_SIZE = 512
+
+def probeStream(filename, extension, parse, size=PROBE_SIZE):
+    # runs parse on just the start of the file, only reads the rest if the header doesn't fit
+    # stays quiet on errors since it's meant for scanning lots of files
+    filename = PathUtil.normPath(filename)
+    if not filename.endswith(extension):
+        return None
+    for readSize in (size, -1):
+        try:
+            with open(filename, 'rb') as f:
+                stream = BinaryFile(f.read(readSize), PathUtil.pathRoot(filename))
+        except OSError:
+            return None
+        try:
+            return parse(stream)
+        except (struct.error, IndexError, UnicodeDecodeError):
+            if len(stream) < size: # already had the whole file
+                return None
+    return None
+
+structCache = {}
+formatCache = {}
+arrayCache = {}
+
+arrayTypes = {"b": "i1", "B": "u1", "h": "i2", "H": "u2", "i": "i4", "I": "u4", "q": "i8", "Q": "u8", "e": "f2", "f": "f4", "d": "f8"}
+
+def getStruct(fmt):
+    compiled = structCache.get(fmt)
+    if compiled is None:
+        compiled = structCache[fmt] = struct.Struct(fmt)
+    return compiled
+
+def arrayType(fmt):
+    # '<fff' -> (dtype('<f4'), 3), only works for formats made of a single type
+    compiled = arrayCache.get(fmt)
+    if compiled is None:
+        prefix, body = (fmt[0], fmt[1:]) if fmt[0] in "<>!=@" else ("=", fmt)
+        if len(body) == 0 or body != body[0] * len(body) or body[0] not in arrayTypes:
+            raise ValueError("format {} can't be read as an array".format(fmt))
+        order = {"!": ">", "@": "="}.get(prefix, prefix)
+        compiled = arrayCache[fmt] = (numpy.dtype(order + arrayTypes[body[0]]), len(body))
+    return compiled
+
+def fusePrefix(fmt):
+    # byte order prefix a segment can be fused under, None if it has to stay on its own
+    if len(fmt) < 2 and fmt in "<>!=@": # no values, fits anywhere
+        return "", ""
+    if fmt[0] in "<>!=":
+        return fmt[0], fmt[1:]
+    if fmt[0] != "@" and fmt == fmt[0] * len(fmt): # single type, no alignment padding to worry about
+        return "=", fmt
+    return None, fmt
+
+def compileFormat(fmts):
+    # turns a descriptor like ('<HH', str, '<III') into read steps, neighbouring struct formats get fused into one Struct
+    key = fmts if isinstance(fmts, str) else tuple(fmts)
+    steps = formatCache.get(key)
+    if steps is not None:
+        return steps
+
+    steps = []
+    run = [] # (prefix, body, itemCount)
+    def flush():
+        if run:
+            prefix = next((r[0] for r in run if r[0]), "<")
+            steps.append((getStruct(prefix + "".join(r[1] for r in run)), tuple(r[2] for r in run)))
+            run.clear()
+
+    for fmt in key:
+        if fmt == str:
+            flush()
+            steps.append(None)
+            continue
+        single = getStruct(fmt)
+        count = len(single.unpack(bytes(single.size)))
+        prefix, body = fusePrefix(fmt)
+        if prefix is None:
+            flush()
+            steps.append((single, (count,)))
+            continue
+        if prefix and run and any(r[0] and r[0] != prefix for r in run):
+            flush()
+        run.append((prefix, body, count))
+    flush()
+
+    steps = formatCache[key] = tuple(steps)
+    return steps
+
+class BinaryFile:
+    # reads straight out of the file buffer with an offset cursor, nothing gets sliced out until it has to
+    def __init__(self, data, path=None):
+        self.buffer = memoryview(data)
+        self.offset = 0
+        self.path = path
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def tell(self):
+        return self.offset
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.offset
+        elif whence == 2:
+            offset += len(self.buffer)
+        self.offset = offset
+        return self.offset
+
+    def skip(self, size):
+        self.offset += size
+
+    def read(self, size=-1):
+        start = self.offset
+        if size < 0:
+            self.offset = len(self.buffer)
+        else:
+            self.offset = min(start + size, len(self.buffer))
+        return self.buffer[start:self.offset].tobytes()
+
     def readString(self, absPaths=False):
-        lb1 = struct.unpack('B', self.read(1))[0]
+        lb1 = self.buffer[self.offset]
         lb2 = 0
+        self.offset += 1
 
         if lb1 > 128:
-            lb2 = struct.unpack('B', self.read(1))[0]
+            lb2 = self.buffer[self.offset]
+            self.offset += 1
 
         l = (lb1 % 128) + (lb2 * 128)
         if l == 0:
             return ''
-        s = self.read(l)
-        s = s.decode('utf8')
+        # slicing past the end would just come back short, probes need this to fail so they retry with the whole file
+        if self.offset + l > len(self.buffer):
+            raise struct.error("string at {} needs {} bytes past the end of the buffer".format(self.offset, self.offset + l - len(self.buffer)))
+        s = str(self.buffer[self.offset:self.offset + l], 'utf8')
+        self.offset += l
 
         if s == "null":
             return None
@@ -59,47 +189,92 @@ class BinaryFile(BytesIO):
 
 
     def readSingle(self, fmt):
-        return list(struct.unpack(fmt, self.read(struct.calcsize(fmt))))
+        compiled = getStruct(fmt)
+        values = compiled.unpack_from(self.buffer, self.offset)
+        self.offset += compiled.size
+        return list(values)
 
     def readClass(self, fmt, cls, absPath=False, flat=True):
-        return cls(*self.readFmt(fmt, absPath, flat))
+        return cls(*self.readSteps(compileFormat(fmt), absPath, flat))
 
     def readClassArray(self, fmt, cls, count, absPath=False, flat=True):
-        l = []
-        for i in range(count):
-            l.append(self.readClass(fmt, cls, absPath, flat))
-        return l
+        steps = compileFormat(fmt)
+        return [cls(*self.readSteps(steps, absPath, flat)) for i in range(count)]
 
     def readCoupledClass(self, mainFmt, mainCls, coupledFmt, coupledCls, before, mainFlat=False, coupledFlat=False):
+        return self.readCoupledSteps(compileFormat(mainFmt), mainCls, compileFormat(coupledFmt), coupledCls, before, mainFlat, coupledFlat)
+
+    def readCoupledClassArray(self, mainFmt, mainCls, coupledFmt, coupledCls, before, count, mainFlat=False, coupledFlat=False):
+        mainSteps = compileFormat(mainFmt)
+        coupledSteps = compileFormat(coupledFmt)
+        return [self.readCoupledSteps(mainSteps, mainCls, coupledSteps, coupledCls, before, mainFlat, coupledFlat) for i in range(count)]
+
+    def readCoupledSteps(self, mainSteps, mainCls, coupledSteps, coupledCls, before, mainFlat, coupledFlat):
         if before:
-            coupledData = self.readFmt(coupledFmt, flat=coupledFlat)
-        mainData = self.readFmt(mainFmt, flat=mainFlat, absPath=True)
+            coupledData = self.readSteps(coupledSteps, flat=coupledFlat)
+        mainData = self.readSteps(mainSteps, flat=mainFlat, absPath=True)
         if not before:
-            coupledData = self.readFmt(coupledFmt, flat=coupledFlat)
+            coupledData = self.readSteps(coupledSteps, flat=coupledFlat)
         return mainCls(*mainData, coupledCls(*coupledData))
 
-    def readCoupledClassArray(self, mainFmt, mainCls, coupledFmt, coupledCls, before, count, mainFlat=False, coupledFlat=False):
-        l = []
-        for i in range(count):
-            l.append(self.readCoupledClass(mainFmt, mainCls, coupledFmt, coupledCls, before, mainFlat, coupledFlat))
-        return l
-
     def readFmt(self, fmts, absPath=False, flat=True):
+        return self.readSteps(compileFormat(fmts), absPath, flat)
+
+    def readSteps(self, steps, absPath=False, flat=True):
         a = []
-        for fmt in fmts:
-            if fmt == str:
+        for step in steps:
+            if step is None:
                 a.append(self.readString(absPath))
+                continue
+            compiled, groups = step
+            values = compiled.unpack_from(self.buffer, self.offset)
+            self.offset += compiled.size
+            if flat:
+                a += values
+            elif len(groups) == 1:
+                a.append(list(values))
             else:
-                if flat:
-                    a += self.readSingle(fmt)
-                else:
-                    a.append(self.readSingle(fmt))
+                i = 0
+                for count in groups:
+                    a.append(list(values[i:i+count]))
+                    i += count
         if len(a) == 1 and flat:
             return a[0]
         return a
 
-    def readFmtArray(self, fmt, count):
-        return tuple(struct.iter_unpack(fmt, self.read(struct.calcsize(fmt) * count)))
+    # the array readers take an optional offset, reading there leaves the cursor alone
+    def readFmtArray(self, fmt, count, offset=None):
+        compiled = getStruct(fmt)
+        size = compiled.size * count
+        start = self.offset if offset is None else offset
+        data = tuple(compiled.iter_unpack(self.buffer[start:start + size]))
+        if offset is None:
+            self.offset += size
+        return data
+
+    def readArray(self, fmt, count, offset=None):
+        # (count, width) numpy view over the file buffer, no per element python objects
+        dtype, width = arrayType(fmt)
+        start = self.offset if offset is None else offset
+        data = numpy.frombuffer(self.buffer, dtype, count * width, start).reshape(count, width)
+        if offset is None:
+            self.offset += dtype.itemsize * width * count
+        return data
+
+    def gatherArray(self, fmt, offsets):
+        # one element at each offset, copied out into a single (len(offsets), width) array
+        dtype, width = arrayType(fmt)
+        raw = numpy.frombuffer(self.buffer, numpy.uint8)
+        index = numpy.asarray(offsets, dtype=numpy.intp).reshape(-1, 1) + numpy.arange(dtype.itemsize * width)
+        return raw[index].view(dtype)
+
+    def skipArray(self, fmt, count):
+        # steps over an array without decoding it, returns where it starts
+        start = self.offset
+        self.offset += getStruct(fmt).size * count
+        if self.offset > len(self.buffer):
+            raise struct.error("array at {} needs {} bytes past the end of the buffer".format(start, self.offset - len(self.buffer)))
+        return start
 
     def readFmtFlatArray(self, fmt, count):
-        return list(struct.unpack(fmt * count, self.read(struct.calcsize(fmt) * count)))
+        return list(itertools.chain.from_iterable(self.readFmtArray(fmt, count)))
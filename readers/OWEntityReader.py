@@ -1,5 +1,7 @@
+from . import AssetCache
 from . import BinaryUtil
 from ..datatypes import EntityTypes
+from ..datatypes.CommonTypes import OWMFileInfo
 
 class OWENTITYFormat():
     extension = "owentity"
@@ -8,8 +10,34 @@ class OWENTITYFormat():
     headerFormat = (str, '<HH', str, str, str, '<IIIi')
     childFormat = (str, '<QQII', str)
     modelLook = (str, str) # 2.1
-    
+
+def pack(data):
+    # disk cache layout, see AssetCache
+    header = data.header
+    fields = {
+        "header": [header.magic, header.major, header.minor, header.GUID, header.modelGUID, header.effectGUID, header.index, header.modelIndex, header.effectIndex, header.childCount],
+        "modelLook": [header.modelLook, header.relativePath],
+        "children": [[child.filepath, child.GUID, child.hardpoint, child.var, child.hardpointIndex, child.varIndex, child.attachment] for child in data.children]
+    }
+    return fields, {}
+
+def unpack(filename, fields, arrays):
+    header = EntityTypes.OWEntityHeader(*fields["header"])
+    header.modelLook, header.relativePath = fields["modelLook"]
+    data = EntityTypes.OWEntityFile(header)
+    data.fixPaths(filename)
+    # children are stored with their paths already fixed
+    for filepath, GUID, hardpoint, var, hpIndex, varIndex, attachment in fields["children"]:
+        child = EntityTypes.OWEntityChild(None, hardpoint, var, hpIndex, varIndex, attachment)
+        child.filepath, child.GUID = filepath, GUID
+        data.children.append(child)
+    return data
+
 def read(filename):
+    data = AssetCache.load(filename, OWENTITYFormat.extension, unpack)
+    if data:
+        return data
+
     stream = BinaryUtil.openStream(filename, OWENTITYFormat.extension)
     if stream == None:
         return None
@@ -27,5 +55,21 @@ def read(filename):
         data.header.modelLook, data.header.relativePath = stream.readFmt(OWENTITYFormat.modelLook)
     
     data.fixPaths(filename)
+
+    AssetCache.store(filename, OWENTITYFormat.extension, data, pack)
     
     return data
+
+def probe(filename):
+    def parse(stream):
+        header = stream.readClass(OWENTITYFormat.headerFormat, EntityTypes.OWEntityHeader)
+        if not BinaryUtil.isCompatible(OWENTITYFormat, header.major, header.minor):
+            return None
+        info = OWMFileInfo(header, filename)
+        # the model look sits after the children, those are small enough to still be in the probe
+        info.children = stream.readClassArray(OWENTITYFormat.childFormat, EntityTypes.OWEntityChild, header.childCount, absPath=True)
+        if header.major >= 2 and header.minor >= 1:
+            header.modelLook, header.relativePath = stream.readFmt(OWENTITYFormat.modelLook)
+        return info
+
+    return BinaryUtil.probeStream(filename, OWENTITYFormat.extension, parse)
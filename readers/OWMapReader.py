@@ -1,5 +1,6 @@
 from . import BinaryUtil
 from ..datatypes import MapTypes
+from ..datatypes.CommonTypes import OWMFileInfo
 
 class OWMAPFormat():
     extension = "owmap"
@@ -7,7 +8,7 @@ class OWMAPFormat():
     minimum = (2,0)
     header = ('<HH', str, '<III')
     object = (str, '<I')
-    record = ('<fff', '<fff', '<ffff')
+    record = '<ffffffffff' # position, scale, rotation
     detail = (str, str)
     light = ('<fff', '<ffff', '<I', '<f', '<fff')
     lightExtra = ('<IIBBBBII', '<fff', '<ffff', '<fff', '<ffff', '<fff', '<ffff', '<ffIHHII')
@@ -35,13 +36,19 @@ def read(filename):
 
         for j in range(object.entityCount):
             entity = stream.readClass(OWMAPFormat.object, MapTypes.OWMAPEntity, absPath=True)
-            entity.records = stream.readClassArray(OWMAPFormat.record, MapTypes.OWMAPRecord, entity.recordCount, flat=False)
+            entity.records = stream.readArray(OWMAPFormat.record, entity.recordCount)
             object.entities.append(entity)
 
         mapData.objects.append(object)
 
     # Details
-    mapData.details = stream.readCoupledClassArray(OWMAPFormat.detail, MapTypes.OWMAPDetail, OWMAPFormat.record, MapTypes.OWMAPRecord, False, header.detailCount,coupledFlat=False)
+    details = []
+    offsets = []
+    for i in range(header.detailCount):
+        details.append(stream.readFmt(OWMAPFormat.detail, absPath=True))
+        offsets.append(stream.skipArray(OWMAPFormat.record, 1))
+    records = stream.gatherArray(OWMAPFormat.record, offsets)
+    mapData.details = [MapTypes.OWMAPDetail(model, material, record) for (model, material), record in zip(details, records)]
     
     # Lights
     if header.major == 2 and header.minor == 0:
@@ -64,3 +71,12 @@ def read(filename):
         mapData.sounds.append(MapTypes.OWMAPSound(position, filecount, files))
 
     return mapData
+
+def probe(filename):
+    def parse(stream):
+        header = stream.readClass(OWMAPFormat.header, MapTypes.OWMAPHeader)
+        if not BinaryUtil.isCompatible(OWMAPFormat, header.major, header.minor):
+            return None
+        return OWMFileInfo(header, filename)
+
+    return BinaryUtil.probeStream(filename, OWMAPFormat.extension, parse)
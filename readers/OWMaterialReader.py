@@ -1,7 +1,11 @@
+from concurrent.futures import ProcessPoolExecutor
 from enum import IntEnum
+from . import AssetCache
 from . import BinaryUtil
 from . import PathUtil
+from . import Prefetch
 from ..datatypes import MaterialTypes
+from ..datatypes.CommonTypes import OWMFile, OWMFileInfo
 from .. import TextureMap
 from ..ui import UIUtil
 
@@ -20,6 +24,41 @@ class OWMATFormat():
     modelLookHeader = '<Q'
     modelLookMaterial = ('<Q', str)
 
+def packInput(value):
+    # static inputs are whatever the reads gave back: a number or a list, a tuple of tuples for arrays, raw bytes for unknown ones
+    if isinstance(value, bytes):
+        return ["bytes", value.hex()]
+    if isinstance(value, tuple):
+        return ["array", [list(row) for row in value]]
+    if isinstance(value, list):
+        return ["values", value]
+    return ["value", value]
+
+def unpackInput(kind, value):
+    if kind == "bytes":
+        return bytes.fromhex(value)
+    if kind == "array":
+        return tuple(tuple(row) for row in value)
+    if kind in ("values", "value"):
+        return value
+    raise ValueError("unknown static input kind {}".format(kind))
+
+def pack(data):
+    # disk cache layout, see AssetCache. only plain materials go through here
+    fields = {
+        "material": [data.textureCount, data.staticInputCount, data.shader],
+        "textures": [[texture.filepath, texture.key, texture.flag] for texture in data.textures],
+        "staticInputs": [[key, *packInput(value)] for key, value in data.staticInputs.items()]
+    }
+    return fields, {}
+
+def unpack(filename, fields, arrays):
+    material = MaterialTypes.OWMATMaterial(*fields["material"])
+    material.setPath(filename)
+    material.textures = [MaterialTypes.OWMATMaterialTexture(*texture) for texture in fields["textures"]]
+    material.staticInputs = {key: unpackInput(kind, value) for key, kind, value in fields["staticInputs"]}
+    return material
+
 def readMaterial(filename, stream):
     material = stream.readClass(OWMATFormat.materialHeader, MaterialTypes.OWMATMaterial)
     material.setPath(filename)
@@ -40,16 +79,22 @@ def readMaterial(filename, stream):
             material.staticInputs[inputHash] = stream.read(inputDataLength)
     return material
 
-def readModelLook(filename, stream):
+def readModelLook(filename, stream, resolve=True):
+    # resolve=False leaves the normalized material paths in materials instead of reading them
     data = MaterialTypes.OWMATModelLook(filename)
     materialCount = stream.readFmt(OWMATFormat.modelLookHeader)
     for i in range(materialCount):
         key, materialFile = stream.readFmt(OWMATFormat.modelLookMaterial)
-        material = read(PathUtil.joinPath(filename, materialFile))
-        data.materials.setdefault(key, material)
+        materialPath = PathUtil.normPath(PathUtil.joinPath(filename, materialFile))
+        data.materials.setdefault(key, read(materialPath) if resolve else materialPath)
     return data
 
-def read(filename):
+def read(filename, resolve=True):
+    # only plain materials get cached, a model look is a short list of keys pointing at those
+    data = AssetCache.load(filename, OWMATFormat.extension, unpack)
+    if data:
+        return data
+
     stream = BinaryUtil.openStream(filename, OWMATFormat.extension)
     if stream == None:
         return None
@@ -63,6 +108,56 @@ def read(filename):
         return False
 
     if header.type == OWMatType.Material:
-        return readMaterial(filename, stream)
+        data = readMaterial(filename, stream)
+        AssetCache.store(filename, OWMATFormat.extension, data, pack)
+        return data
     elif header.type == OWMatType.ModelLook:
-        return readModelLook(filename, stream)
+        return readModelLook(filename, stream, resolve)
+
+# below this many uncached materials forking the workers costs more than it saves
+PARALLEL_MINIMUM = 16
+
+def readMaterials(paths, parallel=False):
+    materials = {path: AssetCache.load(path, OWMATFormat.extension, unpack) for path in paths}
+    missing = [path for path, material in materials.items() if not material]
+    if not parallel or len(missing) < PARALLEL_MINIMUM:
+        materials.update((path, read(path)) for path in missing)
+        return materials
+
+    # same pool as the model prefetch, forked processes on linux and threads everywhere else
+    with Prefetch.createExecutor() as executor:
+        # the files are small, batch them so each task is worth sending to a process
+        for path, material in zip(missing, executor.map(read, missing, chunksize=8)):
+            materials[path] = material
+            # workers filled their own copy of the session cache, keep it here too
+            if material and isinstance(executor, ProcessPoolExecutor):
+                AssetCache.store(path, OWMATFormat.extension, material)
+    return materials
+
+def readModelLooks(filenames, parallel=False):
+    # looks share most of their materials, so read all the looks first and then every material they point at once
+    # returns {filename: data} like read would
+    looks = {filename: read(filename, False) for filename in dict.fromkeys(filenames)}
+    paths = {path for data in looks.values() if isinstance(data, MaterialTypes.OWMATModelLook) for path in data.materials.values()}
+    materials = readMaterials(paths, parallel)
+    for data in looks.values():
+        if isinstance(data, MaterialTypes.OWMATModelLook):
+            data.materials = {key: materials[path] for key, path in data.materials.items()}
+    return looks
+
+def probe(filename):
+    def parse(stream):
+        header = stream.readClass(OWMATFormat.header, MaterialTypes.OWMATHeader, absPath=True)
+        if not BinaryUtil.isCompatible(OWMATFormat, header.major, header.minor):
+            return None
+        info = OWMFileInfo(header, filename)
+        if header.type == OWMatType.Material:
+            info.textureCount, info.staticInputCount, info.shader = stream.readFmt(OWMATFormat.materialHeader)
+        elif header.type == OWMatType.ModelLook:
+            info.materials = {}
+            for i in range(stream.readFmt(OWMATFormat.modelLookHeader)):
+                key, materialFile = stream.readFmt(OWMATFormat.modelLookMaterial)
+                info.materials.setdefault(key, OWMFile(PathUtil.normPath(PathUtil.joinPath(filename, materialFile))))
+        return info
+
+    return BinaryUtil.probeStream(filename, OWMATFormat.extension, parse)
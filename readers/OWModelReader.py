@@ -1,5 +1,7 @@
+from . import AssetCache
 from . import BinaryUtil
 from ..datatypes import ModelTypes
+from ..datatypes.CommonTypes import OWMFileInfo
 
 class OWMDLFormat():
     extension = "owmdl"
@@ -17,9 +19,53 @@ class OWMDLFormat():
     meshColor = '<ffff'
     meshIndex = '<III'
     empty = (str, str, '<fff', '<ffff')
-    
 
-def read(filename):
+# what goes into the disk cache, the processed streams are cheap to derive from these again
+cachedStreams = ("vertices", "indices", "rawUVs", "rawNormals", "rawColor1", "rawColor2", "boneIndices", "boneWeights")
+
+def pack(data):
+    # disk cache layout, see AssetCache
+    header = data.header
+    fields = {
+        "header": [header.major, header.minor, header.material.filepath, header.name, header.guid, header.boneCount, header.meshCount, header.emptyCount],
+        "bones": [[bone.name, bone.parent, bone.pos, bone.scale, bone.rot] for bone in data.refPoseBones],
+        "meshes": [],
+        "empties": [[empty.name, empty.hardpoint, empty.position, empty.rotation] for empty in data.empties]
+    }
+    arrays = {}
+    for i, mesh in enumerate(data.meshes):
+        # streams the file doesn't have decode to [], those stay out of the entry
+        streams = [name for name in cachedStreams if name != "rawUVs" and len(getattr(mesh, name))]
+        fields["meshes"].append([[mesh.name, mesh.materialKey, mesh.uvCount, mesh.vertexCount, mesh.indexCount, mesh.boneDataCount], streams])
+        for name in streams:
+            arrays["{}.{}".format(i, name)] = getattr(mesh, name)
+        for j, uv in enumerate(mesh.rawUVs):
+            arrays["{}.rawUV{}".format(i, j)] = uv
+    return fields, arrays
+
+def unpack(filename, fields, arrays):
+    data = ModelTypes.OWMDLFile(ModelTypes.OWMDLHeader(*fields["header"]), filename)
+    data.refPoseBones = [ModelTypes.OWMDLBone(name, [parent], pos, scale, rot) for name, parent, pos, scale, rot in fields["bones"]]
+    for i, (meshFields, streams) in enumerate(fields["meshes"]):
+        mesh = ModelTypes.OWMDLMesh(*meshFields)
+        mesh.arrays = True
+        for name in cachedStreams:
+            if name != "rawUVs":
+                setattr(mesh, name, arrays["{}.{}".format(i, name)] if name in streams else [])
+        mesh.rawUVs = [arrays["{}.rawUV{}".format(i, j)] for j in range(mesh.uvCount)]
+        data.meshes.append(mesh)
+    data.empties = [ModelTypes.OWMDLEmpty(*empty) for empty in fields["empties"]]
+    return data
+
+def locateStream(stream, mesh, name, fmt, count):
+    mesh.addStream(name, stream.skipArray(fmt, count), fmt, count)
+
+def read(filename, arrays=False):
+    if arrays:
+        data = AssetCache.load(filename, OWMDLFormat.extension, unpack)
+        if data:
+            return data
+
     stream = BinaryUtil.openStream(filename, OWMDLFormat.extension)
     if stream == None:
         return None 
@@ -34,32 +80,50 @@ def read(filename):
     if header.boneCount:
         data.refPoseBones = stream.readClassArray(OWMDLFormat.boneRef, ModelTypes.OWMDLBone, header.boneCount, flat=False)
 
+    # streams are only located here, each one gets decoded the first time it's accessed
+    # arrays: numpy views per stream instead of tuples
     for i in range(header.meshCount):
         mesh = stream.readClass(OWMDLFormat.mesh, ModelTypes.OWMDLMesh)
+        mesh.source = stream
+        mesh.arrays = arrays
 
-        mesh.vertices = stream.readFmtArray(OWMDLFormat.meshVertex, mesh.vertexCount)
+        locateStream(stream, mesh, "vertices", OWMDLFormat.meshVertex, mesh.vertexCount)
 
-        mesh.rawNormals = stream.readFmtArray(OWMDLFormat.meshNormal, mesh.vertexCount)
+        locateStream(stream, mesh, "rawNormals", OWMDLFormat.meshNormal, mesh.vertexCount)
 
-        mesh.tangents = stream.readFmtArray(OWMDLFormat.meshTangent, mesh.vertexCount)
+        locateStream(stream, mesh, "tangents", OWMDLFormat.meshTangent, mesh.vertexCount)
 
         for i in range(mesh.uvCount):
-            mesh.rawUVs.append(stream.readFmtArray(OWMDLFormat.meshUV, mesh.vertexCount))
+            locateStream(stream, mesh, "rawUV{}".format(i), OWMDLFormat.meshUV, mesh.vertexCount)
 
         if mesh.boneDataCount > 0:
-            mesh.boneIndices = stream.readFmtArray(OWMDLFormat.boneIndex*mesh.boneDataCount, mesh.vertexCount)
-            mesh.boneWeights = stream.readFmtArray(OWMDLFormat.boneWeight*mesh.boneDataCount, mesh.vertexCount)
+            boneIndex = OWMDLFormat.boneIndex*mesh.boneDataCount
+            boneWeight = OWMDLFormat.boneWeight*mesh.boneDataCount
+            locateStream(stream, mesh, "boneIndices", boneIndex, mesh.vertexCount)
+            locateStream(stream, mesh, "boneWeights", boneWeight, mesh.vertexCount)
 
-        mesh.rawColor1 = stream.readFmtArray(OWMDLFormat.meshColor, mesh.vertexCount)
+        locateStream(stream, mesh, "rawColor1", OWMDLFormat.meshColor, mesh.vertexCount)
 
-        mesh.rawColor2 = stream.readFmtArray(OWMDLFormat.meshColor, mesh.vertexCount)
+        locateStream(stream, mesh, "rawColor2", OWMDLFormat.meshColor, mesh.vertexCount)
 
-        mesh.indices = stream.readFmtArray(OWMDLFormat.meshIndex, mesh.indexCount)
-
-        mesh.blendProcess()
+        locateStream(stream, mesh, "indices", OWMDLFormat.meshIndex, mesh.indexCount)
 
         data.meshes.append(mesh)
 
     data.empties = stream.readClassArray(OWMDLFormat.empty, ModelTypes.OWMDLEmpty, header.emptyCount, flat=False)
 
+    if arrays:
+        if AssetCache.folder:
+            data.detach(cachedStreams)
+        AssetCache.store(filename, OWMDLFormat.extension, data, pack)
+
     return data
+
+def probe(filename):
+    def parse(stream):
+        header = stream.readClass(OWMDLFormat.header, ModelTypes.OWMDLHeader, absPath=True, flat=True)
+        if not BinaryUtil.isCompatible(OWMDLFormat, header.major, header.minor):
+            return None
+        return OWMFileInfo(header, filename)
+
+    return BinaryUtil.probeStream(filename, OWMDLFormat.extension, parse)
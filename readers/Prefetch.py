@@ -0,0 +1,94 @@
+import os
+import sys
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from . import AssetCache
+from . import OWEntityReader
+from . import OWModelReader
+from ..ui import UIUtil
+
+def createExecutor(processes=True, workers=None):
+    # a spawned interpreter can't import the addon (no bpy outside blender), so worker processes need fork
+    # fork is only safe on linux (macos has it but it's unsafe there), everywhere else this falls back to threads
+    # which still overlaps the file reads
+    workers = workers or os.cpu_count() or 1
+    if processes and sys.platform.startswith("linux"):
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"), initializer=UIUtil.setHeadless)
+    return ThreadPoolExecutor(workers)
+
+def kindOf(filename):
+    return OWEntityReader.OWENTITYFormat.extension if filename.endswith(".owentity") else OWModelReader.OWMDLFormat.extension
+
+def readTree(filename, streams, importChildren):
+    # parses a model or an entity with everything it pulls in, returns {path: data}
+    # models come back detached with the raw streams the cache keeps plus the given processed ones, so they pickle small
+    tree = {}
+    streams = tuple(dict.fromkeys(OWModelReader.cachedStreams + tuple(streams)))
+
+    def readModel(path):
+        if path in tree:
+            return
+        data = OWModelReader.read(path, arrays=True)
+        if data:
+            data = data.detached(streams)
+        tree[path] = data
+
+    def readEntity(path):
+        if path in tree:
+            return
+        data = OWEntityReader.read(path)
+        tree[path] = data
+        if not data:
+            return
+        if data.model:
+            readModel(data.model.filepath)
+        if importChildren:
+            for child in data.children:
+                readEntity(child.filepath)
+
+    if filename.endswith(".owentity"):
+        readEntity(filename)
+    else:
+        readModel(filename)
+    return tree
+
+def rememberTree(tree):
+    # worker processes fill their own copy of the session cache, this puts their results in ours
+    # models only with the raw streams so the processed ones don't count against the cache without being measured
+    for path, data in tree.items():
+        if data:
+            kind = kindOf(path)
+            AssetCache.store(path, kind, data.detached(OWModelReader.cachedStreams) if kind == OWModelReader.OWMDLFormat.extension else data)
+
+def streamModels(filenames, streams, importChildren, depth, processes=True):
+    # yields one tree per filename in order while the workers read ahead, failed reads are kept as None
+    # and the importer reads those again itself so the errors get reported
+    # at most depth reads are in flight or waiting to be consumed, which is the backpressure
+    # files already in the session cache are read here from that instead of going to a worker
+    executor = createExecutor(processes)
+    remember = isinstance(executor, ProcessPoolExecutor)
+
+    def submit(filename):
+        if AssetCache.load(filename, kindOf(filename)) is not None:
+            return filename, None
+        return filename, executor.submit(readTree, filename, streams, importChildren)
+
+    try:
+        filenames = iter(filenames)
+        pending = deque(submit(filename) for filename in islice(filenames, max(depth, 1)))
+        while pending:
+            filename, future = pending.popleft()
+            if future is None:
+                tree = readTree(filename, streams, importChildren)
+            else:
+                tree = future.result()
+                if remember:
+                    rememberTree(tree)
+            for filename in islice(filenames, 1):
+                pending.append(submit(filename))
+            yield tree
+    finally:
+        executor.shutdown(cancel_futures=True)
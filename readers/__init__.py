@@ -1,3 +1,4 @@
+from . import AssetCache
 from . import BinaryUtil
 from . import PathUtil
 from . import OWAnimReader
@@ -5,4 +6,5 @@ from . import OWEffectReader
 from . import OWEntityReader
 from . import OWMapReader
 from . import OWMaterialReader
-from . import OWModelReader
\ No newline at end of file
+from . import OWModelReader
+from . import Prefetch
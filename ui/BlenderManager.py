@@ -28,12 +28,17 @@ class OvertoolsMenu(bpy.types.Menu):
         self.layout.operator(ImportMaterialOperator.ImportOWMAT.bl_idname, text='Material (.owmat)')
         self.layout.operator(ImportAnimationOperator.ImportOWANIMCLIP.bl_idname, text='Animation (.owanimclip)')
 
+@persistent
+def syncCacheOnLoad(dummy):
+    Preferences.syncCache()
+
 def overtoolsMenuDraw(self, context):
     self.layout.menu("OWM_MT_overtools_menu", text="Overtools")
 
 
 classes = (
     Preferences.OWMPreferences,
+    Preferences.OWMClearCacheOp,
     # Setting props
     SettingTypes.OWModelSettings,
     SettingTypes.OWEntitySettings,
@@ -53,6 +58,7 @@ classes = (
     LibraryHandler.OWMDisconnectAOOp,
     UtilityOperators.OWMCleanupOp,
     UtilityOperators.OWMCleanupTexOp,
+    UtilityOperators.OWMFlushCacheOp,
     UtilityOperators.OWMChangeModelLookOp,
     DatatoolLibHandler.OWMBuildTextureDB,
     DatatoolLibHandler.OWMFixTextures,
@@ -80,6 +86,10 @@ def register():
 
     bpy.types.TOPBAR_MT_file_import.append(overtoolsMenuDraw)
 
+    # preferences may not be there yet while the addon is being enabled, load_post catches startup
+    Preferences.syncCache()
+    bpy.app.handlers.load_post.append(syncCacheOnLoad)
+
 
 def unregister():
     #do not change this order or reloading will break
@@ -94,3 +104,6 @@ def unregister():
         bpy.utils.unregister_class(cls)
 
     bpy.types.TOPBAR_MT_file_import.remove(overtoolsMenuDraw)
+
+    if syncCacheOnLoad in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(syncCacheOnLoad)
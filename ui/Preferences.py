@@ -1,8 +1,26 @@
 import bpy
 
+from ..readers import AssetCache
+from ..readers import PathUtil
+
+CACHE_FOLDER = ".owmcache"
+
 def getPreferences():
     return bpy.context.preferences.addons[__package__.split(".")[0]].preferences
 
+def cachePath(prefs):
+    return PathUtil.normPath(PathUtil.joinPath(prefs.datatoolOutPath, CACHE_FOLDER))
+
+def syncCache(self=None, context=None):
+    # pushes the cache settings down to the readers, they don't know about bpy
+    try:
+        prefs = getPreferences()
+    except (KeyError, AttributeError): # not registered yet
+        return
+    enabled = prefs.diskCache and prefs.datatoolOutPath != ""
+    AssetCache.configure(cachePath(prefs) if enabled else None, prefs.diskCacheSize*1024*1024)
+    AssetCache.configureMemory(prefs.memoryCacheSize*1024*1024)
+
 class OWMPreferences(bpy.types.AddonPreferences):
     bl_idname = __package__.split(".")[0] # ¯\_(ツ)_/¯
 
@@ -25,15 +43,55 @@ class OWMPreferences(bpy.types.AddonPreferences):
         name="DataTool output path",
         description="Path to the DataTool output folder",
         subtype='DIR_PATH',
-        default='')
+        default='',
+        update=syncCache)
+
+    memoryCacheSize: bpy.props.IntProperty(
+        name="Session Cache Size (MB)",
+        description="Parsed files kept in memory between imports, by source file size. 0 turns it off",
+        default=512,
+        min=0,
+        update=syncCache)
+
+    diskCache: bpy.props.BoolProperty(
+        name="Cache Parsed Files",
+        description="Keep parsed models, entities and materials in a folder inside the DataTool output path so later imports skip parsing",
+        default=False,
+        update=syncCache)
+
+    diskCacheSize: bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description="Least recently used entries are removed once the cache grows past this",
+        default=2048,
+        min=16,
+        update=syncCache)
 
     def draw(self, context):
         self.layout.prop(self, "datatoolOutPath")
         self.layout.label(text="(should be the root folder, not the \"Heroes\" or \"Maps\" folder created by DataTool)")
+
+        cacheBox = self.layout.box()
+        cacheBox.prop(self, "memoryCacheSize")
+        cacheBox.prop(self, "diskCache")
+        if self.diskCache:
+            row = cacheBox.row()
+            row.prop(self, "diskCacheSize")
+            row.operator(OWMClearCacheOp.bl_idname, icon="TRASH")
         
         developerOptionsBox = self.layout.box()
         developerOptionsBox.label(text="Developer Options:")
         developerOptionsBox.label(text="(leave these alone unless you know what you're doing)")
         #developerOptionsBox.prop(self, "experimental")
         developerOptionsBox.prop(self, "devMode")
-        #developerOptionsBox.prop(self, "debugLogging")
\ No newline at end of file
+        #developerOptionsBox.prop(self, "debugLogging")
+
+
+class OWMClearCacheOp(bpy.types.Operator):
+    """Deletes everything in the parsed file cache"""
+    bl_idname = "owm3.clear_disk_cache"
+    bl_label = "Clear Cache"
+
+    def execute(self, context):
+        syncCache()
+        AssetCache.clear()
+        return {'FINISHED'}
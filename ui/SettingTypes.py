@@ -1,5 +1,5 @@
 import bpy
-from bpy.props import BoolProperty, FloatProperty, IntProperty, StringProperty
+from bpy.props import BoolProperty, EnumProperty, FloatProperty, IntProperty, StringProperty
 
 class OWModelSettings(bpy.types.PropertyGroup):
     importNormals: BoolProperty(
@@ -155,6 +155,31 @@ class OWMapSettings(bpy.types.PropertyGroup):
         default=True,
     )
 
+    instancingMode: EnumProperty(
+        name='Instances',
+        description='How repeated models are placed on the map',
+        items=[
+            ('OBJECTS', 'Objects', 'A copy of the model objects for every instance'),
+            ('POINTS', 'Geometry Nodes', 'One point per instance, a geometry nodes modifier instances the model from a hidden collection. Object count scales with unique models'),
+            ('COLLECTION', 'Collection Instances', 'Every model is built once in a hidden collection, each instance is an empty instancing that collection'),
+        ],
+        default='OBJECTS',
+    )
+
+    parallelParsing: BoolProperty(
+        name='Parallel Parsing',
+        description='Parse model files on all cores while objects are being created',
+        default=True,
+    )
+
+    prefetchDepth: IntProperty(
+        name='Read Ahead',
+        description='How many models the parsing workers may get ahead of object creation. Higher uses more memory',
+        default=32,
+        min=1,
+        max=1024,
+    )
+
     fixTopology: BoolProperty(
         name='Fix Topology',
         description='Convert triangulated quads back into proper quads using topology influence',
@@ -183,7 +208,14 @@ class OWMapSettings(bpy.types.PropertyGroup):
         layout.prop(me, 'importLights')
         layout.prop(me, 'removeCollision')
         layout.prop(me, 'joinMeshes')
-        layout.prop(me, 'useInstancing')
+        layout.prop(me, 'instancingMode')
+        if me.instancingMode == 'OBJECTS':
+            row = layout.row()
+            row.prop(me, 'useInstancing')
+        layout.prop(me, 'parallelParsing')
+        if me.parallelParsing:
+            row = layout.row()
+            row.prop(me, 'prefetchDepth')
         layout.prop(me, 'fixTopology')
         layout.prop(me, 'mergeVertices')
         if me.mergeVertices:
@@ -1,6 +1,8 @@
 import bpy
 import inspect
+import threading
 mute = False
+headless = False # set in worker processes, they have no UI to show anything in
 filesErrored = 0
 
 def startMapLoad():
@@ -15,7 +17,13 @@ def finishMapLoad():
         createPopup("Failed to open {} files".format(filesErrored),"¯\_(ツ)_/¯")
         filesErrored=0
 
+def setHeadless():
+    global headless
+    headless = True
+
 def createPopup(title, label, icon='ERROR'):
+    if headless or threading.current_thread() is not threading.main_thread():
+        return
     bpy.context.window_manager.popup_menu(lambda self, context: self.layout.label(text=" "+label), title = title, icon = icon)
 
 def ow1FileError():
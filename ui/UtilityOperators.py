@@ -1,4 +1,5 @@
 import bpy
+from ..readers import AssetCache
 from ..readers import PathUtil
 from . import LibraryHandler
 from . import Preferences
@@ -39,6 +40,9 @@ class OWMUtilityPanel(bpy.types.Panel):
         row.operator(OWMCleanupOp.bl_idname, text="Unused Socket Objects", icon="OBJECT_DATA")
         #row.operator(OWMCleanupTexOp.bl_idname, text="Unused Materials", icon="MATERIAL")
 
+        row = box.row()
+        row.operator(OWMFlushCacheOp.bl_idname, text="Flush Parsed File Cache", icon="FILE_REFRESH")
+
         box = layout.box()
         box.label(text="Material Operators")
         row = box.row()
@@ -51,6 +55,16 @@ class OWMUtilityPanel(bpy.types.Panel):
             row = box.row()
             row.operator(DatatoolLibHandler.OWMFixTextures.bl_idname, text="Fix Missing Textures", icon="LINK_BLEND")
 
+class OWMFlushCacheOp(bpy.types.Operator):
+    """Forgets the files parsed during this session, the next import reads them again"""
+    bl_idname = "owm3.flush_cache"
+    bl_label = "Flush Parsed File Cache"
+
+    def execute(self, context):
+        count = AssetCache.flushMemory()
+        self.report({'INFO'}, "Flushed {} parsed files".format(count))
+        return {'FINISHED'}
+
 class OWMCleanupOp(bpy.types.Operator):
     """Deletes empty objects with no sub objects"""
     bl_idname = "owm3.delete_unused_empties"